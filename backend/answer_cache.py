@@ -0,0 +1,106 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+class SemanticAnswerCache:
+    """LRU/TTL cache of chat answers keyed on the query and the index version.
+
+    Exact repeats (after whitespace/case normalisation) are answered without embedding
+    the query. Otherwise the query embedding is compared with the cached ones and the
+    closest entry is reused if its cosine distance is within `max_distance`. Entries
+    belong to the index version they were answered from; only the version
+    `current_version()` returns is served, and requests still leasing an older one
+    bypass the cache instead of evicting the newer entries.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_distance: float, current_version: Callable[[], Any]):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self.current_version = current_version
+        self._entries: "OrderedDict[Tuple[Any, str], Dict[str, Any]]" = OrderedDict()
+        self._index_version = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stale_bypasses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _sync(self, current):
+        # Versions only move forward, so entries from older ones can never be served again.
+        if current != self._index_version:
+            for key in [k for k in self._entries if k[0] != current]:
+                del self._entries[key]
+            self._index_version = current
+        cutoff = time.time() - self.ttl_seconds
+        for key in [k for k, e in self._entries.items() if e["created"] < cutoff]:
+            del self._entries[key]
+
+    def lookup(self, query: str, index_version, embed_query: Callable[[str], List[float]]) -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """Return (cached value or None, query embedding or None if never computed)."""
+        current = self.current_version()
+        if index_version != current:
+            with self._lock:
+                self.stale_bypasses += 1
+            return None, None
+        key = (index_version, self.normalize(query))
+        with self._lock:
+            self._sync(current)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["value"], entry["embedding"]
+        embedding = self._unit(embed_query(query))
+        with self._lock:
+            self._sync(current)
+            keys = [k for k in self._entries if k[0] == index_version]
+            if keys:
+                matrix = np.stack([self._entries[k]["embedding"] for k in keys])
+                similarities = matrix @ embedding
+                best = int(np.argmax(similarities))
+                if 1.0 - float(similarities[best]) <= self.max_distance:
+                    self._entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return self._entries[keys[best]]["value"], embedding
+            self.misses += 1
+        return None, embedding
+
+    def store(self, query: str, embedding: Optional[np.ndarray], value: Any, index_version):
+        if embedding is None:
+            return
+        key = (index_version, self.normalize(query))
+        current = self.current_version()
+        with self._lock:
+            if index_version != current:
+                return
+            self._sync(current)
+            self._entries[key] = {"value": value, "embedding": embedding, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "index_version": self._index_version,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "stale_bypasses": self.stale_bypasses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,98 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+BM25_FILENAME = "bm25_index.json"
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """In-process inverted index over chunk text, scored with Okapi BM25.
+
+    Documents are added and removed by chunk id, so it is updated incrementally
+    alongside the Chroma collection and persisted as JSON next to it. Only term
+    frequencies and lengths are kept; the text itself is read from the vector store.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._docs: Dict[str, Dict] = {}
+        self._postings: Dict[str, set] = defaultdict(set)
+        self._total_length = 0
+        self._lock = threading.RLock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for doc_id, doc in json.load(f).get("docs", {}).items():
+                    # Files written before text moved out also carry "text" and "metadata"; drop them.
+                    self._insert(doc_id, {"tf": doc["tf"], "length": doc["length"]})
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _insert(self, doc_id: str, doc: Dict):
+        self._docs[doc_id] = doc
+        self._total_length += doc["length"]
+        for term in doc["tf"]:
+            self._postings[term].add(doc_id)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                self._delete(doc_id)
+                tokens = tokenize(text)
+                self._insert(doc_id, {"tf": dict(Counter(tokens)), "length": len(tokens)})
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._delete(doc_id)
+
+    def _delete(self, doc_id: str):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc["length"]
+        for term in doc["tf"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id in postings:
+                    doc = self._docs[doc_id]
+                    tf = doc["tf"][term]
+                    norm = self.k1 * (1 - self.b + self.b * doc["length"] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"docs": self._docs}, f)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+import config
+
+# Event loop whose limiter worker threads acquire slots from; set by `GenerationLimiter.bound_to`.
+_bound_loop: contextvars.ContextVar = contextvars.ContextVar("documind_generation_loop", default=None)
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue is full. Retry after {retry_after}s.")
+        self.retry_after = retry_after
+
+class GenerationLimiter:
+    """Caps concurrent LLM generations and bounds how many requests may wait for one.
+
+    Requests beyond `max_concurrency + max_queue` are rejected immediately with
+    QueueFullError instead of piling up behind a slow generation. Background report
+    calls are counted separately and never count against that queue bound.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, retry_after: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._background_waiting = 0
+        self._active = 0
+
+    def check_capacity(self):
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            raise QueueFullError(self.retry_after)
+
+    async def acquire(self, background: bool = False):
+        if background:
+            self._background_waiting += 1
+        else:
+            self.check_capacity()
+            self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            if background:
+                self._background_waiting -= 1
+            else:
+                self._waiting -= 1
+        self._active += 1
+
+    def release(self):
+        self._active -= 1
+        self._semaphore.release()
+
+    def acquire_from_thread(self, loop: asyncio.AbstractEventLoop):
+        """Blocking acquire for worker threads, waiting on the event loop's semaphore.
+
+        Background jobs were admitted when they were queued, so they wait for a slot
+        instead of being rejected by the queue bound, and their waiting calls don't
+        fill that bound for interactive requests.
+        """
+        asyncio.run_coroutine_threadsafe(self.acquire(background=True), loop).result()
+
+    def release_from_thread(self, loop: asyncio.AbstractEventLoop):
+        loop.call_soon_threadsafe(self.release)
+
+    @contextmanager
+    def bound_to(self, loop: asyncio.AbstractEventLoop):
+        """Let `thread_slot()` calls in this context (and copies of it) take slots from `loop`."""
+        token = _bound_loop.set(loop)
+        try:
+            yield
+        finally:
+            _bound_loop.reset(token)
+
+    @contextmanager
+    def thread_slot(self):
+        """Hold a slot around one blocking LLM call in a worker thread; no-op outside `bound_to()`."""
+        loop = _bound_loop.get()
+        if loop is None:
+            yield
+            return
+        self.acquire_from_thread(loop)
+        try:
+            yield
+        finally:
+            self.release_from_thread(loop)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "background_waiting": self._background_waiting,
+        }
+
+generation_limiter = GenerationLimiter(config.LLM_MAX_CONCURRENCY, config.LLM_MAX_QUEUE, config.LLM_RETRY_AFTER_SECONDS)
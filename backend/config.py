@@ -0,0 +1,74 @@
+import os
+
+DATA_PATH = os.environ.get("DOCUMIND_DATA_PATH", "../sample_data")
+CHROMA_PATH = os.environ.get("DOCUMIND_CHROMA_PATH", "chroma_db")
+WORKSPACES_DIR = os.environ.get("DOCUMIND_WORKSPACES_DIR", "workspaces")
+MAX_ACTIVE_WORKSPACES = int(os.environ.get("DOCUMIND_MAX_ACTIVE_WORKSPACES", "8"))
+# Each ingestion copies the whole index into a new version; superseded copies stay on disk for this long.
+INDEX_GC_GRACE_SECONDS = float(os.environ.get("DOCUMIND_INDEX_GC_GRACE_SECONDS", "600"))
+INGEST_JOB_WORKERS = int(os.environ.get("DOCUMIND_INGEST_JOB_WORKERS", "2"))
+
+EMBEDDING_MODEL_NAME = os.environ.get("DOCUMIND_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.environ.get("DOCUMIND_EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.environ.get("DOCUMIND_ONNX_MODEL_DIR", "onnx_models")
+ONNX_MIN_COSINE = float(os.environ.get("DOCUMIND_ONNX_MIN_COSINE", "0.98"))
+LLM_MODEL_NAME = os.environ.get("DOCUMIND_LLM_MODEL", "llama3:8b")
+RETRIEVER_K = int(os.environ.get("DOCUMIND_RETRIEVER_K", "4"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("DOCUMIND_CONTEXT_TOKEN_BUDGET", "1500"))
+
+VECTOR_BACKEND = os.environ.get("DOCUMIND_VECTOR_BACKEND", "chroma")
+MMAP_VECTOR_DTYPE = os.environ.get("DOCUMIND_MMAP_VECTOR_DTYPE", "int8")
+MMAP_ANN_MIN_ROWS = int(os.environ.get("DOCUMIND_MMAP_ANN_MIN_ROWS", "50000"))
+MMAP_ANN_NPROBE = int(os.environ.get("DOCUMIND_MMAP_ANN_NPROBE", "8"))
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("DOCUMIND_LLM_MAX_CONCURRENCY", "2"))
+LLM_MAX_QUEUE = int(os.environ.get("DOCUMIND_LLM_MAX_QUEUE", "8"))
+LLM_RETRY_AFTER_SECONDS = int(os.environ.get("DOCUMIND_LLM_RETRY_AFTER_SECONDS", "15"))
+
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("DOCUMIND_ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("DOCUMIND_ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_DISTANCE = float(os.environ.get("DOCUMIND_ANSWER_CACHE_MAX_DISTANCE", "0.08"))
+
+HYBRID_RETRIEVAL = os.environ.get("DOCUMIND_HYBRID_RETRIEVAL", "1") == "1"
+HYBRID_FETCH_K = int(os.environ.get("DOCUMIND_HYBRID_FETCH_K", "20"))
+HYBRID_RRF_K = int(os.environ.get("DOCUMIND_HYBRID_RRF_K", "60"))
+
+EMBED_BATCH_SIZE = int(os.environ.get("DOCUMIND_EMBED_BATCH_SIZE", "64"))
+EMBED_WRITE_BATCH_SIZE = int(os.environ.get("DOCUMIND_EMBED_WRITE_BATCH_SIZE", "512"))
+EMBED_THREADS = int(os.environ.get("DOCUMIND_EMBED_THREADS", "0"))
+EMBED_PROCESSES = int(os.environ.get("DOCUMIND_EMBED_PROCESSES", "1"))
+
+EMBEDDING_CACHE_PATH = os.environ.get("DOCUMIND_EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_MB = float(os.environ.get("DOCUMIND_EMBEDDING_CACHE_MAX_MB", "512"))
+
+EXTRACTION_CACHE_DIR = os.environ.get("DOCUMIND_EXTRACTION_CACHE_DIR", "extraction_cache")
+EXTRACT_WORKERS = int(os.environ.get("DOCUMIND_EXTRACT_WORKERS", "0"))
+OCR_MIN_TEXT_CHARS = int(os.environ.get("DOCUMIND_OCR_MIN_TEXT_CHARS", "50"))
+OCR_DPI = int(os.environ.get("DOCUMIND_OCR_DPI", "300"))
+
+REPORT_MODE = os.environ.get("DOCUMIND_REPORT_MODE", "planned")
+REPORT_TOOL_WORKERS = int(os.environ.get("DOCUMIND_REPORT_TOOL_WORKERS", "4"))
+REPORT_JOB_WORKERS = int(os.environ.get("DOCUMIND_REPORT_JOB_WORKERS", "2"))
+REPORTS_DIR = os.environ.get("DOCUMIND_REPORTS_DIR", "temp_reports")
+REPORT_STORE_MAX_MB = float(os.environ.get("DOCUMIND_REPORT_STORE_MAX_MB", "500"))
+REPORT_STORE_MAX_AGE_HOURS = float(os.environ.get("DOCUMIND_REPORT_STORE_MAX_AGE_HOURS", "24"))
+REPORT_IN_MEMORY = os.environ.get("DOCUMIND_REPORT_IN_MEMORY", "1") == "1"
+REPORT_IMAGE_DPI = int(os.environ.get("DOCUMIND_REPORT_IMAGE_DPI", "150"))
+REPORT_IMAGE_JPEG_QUALITY = int(os.environ.get("DOCUMIND_REPORT_IMAGE_JPEG_QUALITY", "85"))
+REPORT_IMAGE_CACHE_ENTRIES = int(os.environ.get("DOCUMIND_REPORT_IMAGE_CACHE_ENTRIES", "64"))
+
+RETRIEVAL_MEMO_MAX_ENTRIES = int(os.environ.get("DOCUMIND_RETRIEVAL_MEMO_MAX_ENTRIES", "1024"))
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("DOCUMIND_QUERY_EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+
+SUMMARY_CHUNKS = int(os.environ.get("DOCUMIND_SUMMARY_CHUNKS", "12"))
+SUMMARY_WORKERS = int(os.environ.get("DOCUMIND_SUMMARY_WORKERS", "4"))
+SUMMARY_REDUCE_FAN_IN = int(os.environ.get("DOCUMIND_SUMMARY_REDUCE_FAN_IN", "4"))
+SUMMARY_CACHE_PATH = os.environ.get("DOCUMIND_SUMMARY_CACHE_PATH", "summary_cache.sqlite3")
+SUMMARY_CACHE_MAX_MB = float(os.environ.get("DOCUMIND_SUMMARY_CACHE_MAX_MB", "64"))
+
+FIGURE_THUMBNAIL_PX = int(os.environ.get("DOCUMIND_FIGURE_THUMBNAIL_PX", "256"))
+FIGURE_SEARCH_K = int(os.environ.get("DOCUMIND_FIGURE_SEARCH_K", "1"))
+FIGURE_MIN_SCORE = float(os.environ.get("DOCUMIND_FIGURE_MIN_SCORE", "0.35"))
+
+WARMUP_ON_STARTUP = os.environ.get("DOCUMIND_WARMUP_ON_STARTUP", "1") == "1"
+LOG_LEVEL = os.environ.get("DOCUMIND_LOG_LEVEL", "INFO").upper()
@@ -0,0 +1,108 @@
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text with llama3's tokenizer; only used to size the budget.
+CHARS_PER_TOKEN = 4
+# Longest chunk overlap looked for when chunks carry no start_index.
+MAX_OVERLAP_CHARS = 400
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+class _Span:
+    def __init__(self, doc, rank: int):
+        self.rank = rank
+        self.text = doc.page_content
+        self.start = doc.metadata.get("start_index")
+        self.source = doc.metadata.get("source", "")
+        self.page = doc.metadata.get("page")
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+    def absorb(self, other: "_Span") -> bool:
+        """Append `other` if it continues or repeats this span; returns False if the two are unrelated."""
+        if other.text in self.text:
+            pass
+        elif self.start is not None and other.start is not None:
+            if other.start > self.end:
+                return False
+            self.text += other.text[self.end - other.start:]
+        else:
+            size = _overlap(self.text, other.text)
+            if not size:
+                return False
+            self.text += other.text[size:]
+        self.rank = min(self.rank, other.rank)
+        return True
+
+    def header(self, number: int) -> str:
+        name = os.path.basename(self.source) or "document"
+        return f"[{number}] {name}, p. {self.page}" if self.page is not None else f"[{number}] {name}"
+
+def _merge(docs) -> List[_Span]:
+    """Merge chunks from the same source page that touch or overlap into single spans."""
+    groups: Dict[Tuple[str, object], List[_Span]] = {}
+    for rank, doc in enumerate(docs):
+        span = _Span(doc, rank)
+        groups.setdefault((span.source, span.page), []).append(span)
+    merged = []
+    for spans in groups.values():
+        if all(s.start is not None for s in spans):
+            spans.sort(key=lambda s: s.start)
+        current = spans[0]
+        for span in spans[1:]:
+            if not current.absorb(span):
+                merged.append(current)
+                current = span
+        merged.append(current)
+    return sorted(merged, key=lambda s: s.rank)
+
+def build_context(docs, token_budget: int = config.CONTEXT_TOKEN_BUDGET, headers: bool = True) -> Tuple[str, Dict]:
+    """Pack retrieved documents into a prompt context of at most `token_budget` tokens.
+
+    Adjacent and overlapping chunks from the same page are merged, metadata is reduced
+    to a short source line, and spans are added in relevance order until the budget is
+    spent (the most relevant span is truncated rather than dropped). Returns the context
+    and token stats against passing the Document list to the prompt verbatim.
+    """
+    blocks, used, dropped = [], 0, 0
+    for span in _merge(docs):
+        text = span.text.strip()
+        block = f"{span.header(len(blocks) + 1)}\n{text}" if headers else text
+        tokens = estimate_tokens(block) + (1 if blocks else 0)
+        if used + tokens > token_budget:
+            if blocks:
+                dropped += 1
+                continue
+            block = block[:token_budget * CHARS_PER_TOKEN]
+            tokens = estimate_tokens(block)
+        blocks.append(block)
+        used += tokens
+    context = "\n\n".join(blocks)
+    raw_tokens = estimate_tokens(str(list(docs)))
+    stats = {
+        "chunks": len(docs),
+        "spans": len(blocks),
+        "spans_dropped": dropped,
+        "raw_tokens": raw_tokens,
+        "context_tokens": estimate_tokens(context),
+        "tokens_saved": max(0, raw_tokens - estimate_tokens(context)),
+    }
+    metrics.CONTEXT_TOKENS.inc(stats["context_tokens"], kind="packed")
+    metrics.CONTEXT_TOKENS.inc(stats["tokens_saved"], kind="saved")
+    logger.debug(f"Packed {len(docs)} chunk(s) into {len(blocks)} span(s): {stats['context_tokens']} tokens, {stats['tokens_saved']} saved")
+    return context, stats
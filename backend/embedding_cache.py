@@ -0,0 +1,99 @@
+import logging
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """On-disk float32 vectors keyed by hash of (model name, chunk text).
+
+    Lives outside the Chroma directory so it survives index rebuilds. When the stored
+    vectors exceed `max_bytes`, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        # Totals are read once here and then kept up to date by put_many/_evict.
+        self._bytes, self._count = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings"
+        ).fetchone()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            replaced, replaced_bytes = self._sizes([key for key, _, _ in rows])
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+            self._bytes += sum(len(blob) for _, blob, _ in rows) - replaced_bytes
+            self._count += len(rows) - replaced
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _sizes(self, keys: List[str]):
+        """Number and total size of the stored vectors among `keys`."""
+        count = total = 0
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found, size = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchone()
+            count += found
+            total += size
+        return count, total
+
+    def _evict(self):
+        excess_rows = int((self._bytes - self.max_bytes) / (self._bytes / self._count)) + 1
+        oldest = "SELECT key FROM embeddings ORDER BY last_used LIMIT ?"
+        freed, removed = self._conn.execute(
+            f"SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings WHERE key IN ({oldest})", (excess_rows,)
+        ).fetchone()
+        self._conn.execute(f"DELETE FROM embeddings WHERE key IN ({oldest})", (excess_rows,))
+        self._conn.commit()
+        self._bytes -= freed
+        self._count -= removed
+        logger.info(f"Embedding cache over {self.max_bytes} bytes. Evicted {removed} least recently used vector(s).")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": self._count, "bytes": self._bytes, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
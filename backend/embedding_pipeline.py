@@ -0,0 +1,102 @@
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+import config
+from embedding_cache import EmbeddingCache
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+def configure_threads(num_threads: int = config.EMBED_THREADS):
+    """Set PyTorch intra-op threads for the sentence-transformer (0 keeps the default)."""
+    if num_threads > 0:
+        import torch
+        torch.set_num_threads(num_threads)
+
+class EmbeddingPipeline:
+    """Embeds chunks in batches and writes them to the vector store in bulk.
+
+    With `processes > 1` and a sentence-transformers backed embedder, batches are
+    encoded by a multi-process pool spread across cores. When a cache is given,
+    vectors are looked up there first and only the misses reach the model.
+    """
+
+    def __init__(self, embeddings, batch_size: int = config.EMBED_BATCH_SIZE,
+                 write_batch_size: int = config.EMBED_WRITE_BATCH_SIZE, processes: int = config.EMBED_PROCESSES,
+                 cache: Optional[EmbeddingCache] = None, model_name: str = config.EMBEDDING_MODEL_NAME):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.write_batch_size = write_batch_size
+        self.processes = processes
+        self.cache = cache
+        self.model_name = model_name
+        self._pool = None
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        client = getattr(self.embeddings, "client", None)
+        if self.processes > 1 and client is not None and hasattr(client, "start_multi_process_pool"):
+            if self._pool is None:
+                self._pool = client.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+            texts = [text.replace("\n", " ") for text in texts]
+            return client.encode_multi_process(texts, self._pool, batch_size=self.batch_size).tolist()
+        return self.embeddings.embed_documents(texts)
+
+    def _close(self):
+        if self._pool is not None:
+            self.embeddings.client.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def _embed_batch(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        if self.cache is None:
+            with span("embed"):
+                return self._encode(texts), 0
+        keys = [EmbeddingCache.key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            with span("embed"):
+                fresh = dict(zip(missing.keys(), self._encode(list(missing.values()))))
+            self.cache.put_many(fresh)
+            vectors.update(fresh)
+        return [vectors[key] for key in keys], len(texts) - len(missing)
+
+    def embed_and_store(self, vectorstore, ids: List[str], texts: List[str], metadatas: List[Dict]) -> Dict:
+        started = time.perf_counter()
+        if hasattr(vectorstore, "upsert_vectors"):
+            write, max_batch = vectorstore.upsert_vectors, self.write_batch_size
+        else:
+            collection = vectorstore._collection
+            write, max_batch = collection.upsert, min(self.write_batch_size, collection._client.get_max_batch_size())
+        embed_seconds = 0.0
+        cache_hits = 0
+        try:
+            for start in range(0, len(texts), max_batch):
+                batch_started = time.perf_counter()
+                vectors, hits = self._embed_batch(texts[start:start + max_batch])
+                embed_seconds += time.perf_counter() - batch_started
+                cache_hits += hits
+                with span("chroma_write"):
+                    write(
+                        ids=ids[start:start + max_batch],
+                        embeddings=vectors,
+                        documents=texts[start:start + max_batch],
+                        metadatas=metadatas[start:start + max_batch],
+                    )
+                done = min(start + max_batch, len(texts))
+                logger.debug(f"  -> Embedded {done}/{len(texts)} chunks ({done / embed_seconds if embed_seconds else 0:.1f} chunks/s, {cache_hits} from cache)")
+        finally:
+            self._close()
+        total_seconds = time.perf_counter() - started
+        return {
+            "chunks": len(texts),
+            "cache_hits": cache_hits,
+            "embed_seconds": round(embed_seconds, 3),
+            "total_seconds": round(total_seconds, 3),
+            "chunks_per_second": round(len(texts) / embed_seconds, 2) if embed_seconds else 0.0,
+            "batch_size": self.batch_size,
+            "write_batch_size": max_batch,
+            "processes": self.processes,
+        }
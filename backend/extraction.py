@@ -0,0 +1,121 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+import config
+from figure_index import IMAGE_EXTENSIONS, assets_present, extract_figures
+
+PDF_EXTENSIONS = {".pdf"}
+CACHE_SCHEMA_VERSION = 2
+
+def _configure_worker(tesseract_cmd: Optional[str]):
+    if tesseract_cmd:
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+def _ocr_image(image) -> str:
+    import pytesseract
+    return pytesseract.image_to_string(image)
+
+def _extract_pdf(path: str) -> List[Dict]:
+    from pypdf import PdfReader
+    pages = []
+    for number, page in enumerate(PdfReader(path).pages, start=1):
+        text = page.extract_text() or ""
+        if len(text.strip()) >= config.OCR_MIN_TEXT_CHARS:
+            pages.append({"page": number, "text": text, "ocr": False})
+            continue
+        from pdf2image import convert_from_path
+        images = convert_from_path(path, dpi=config.OCR_DPI, first_page=number, last_page=number)
+        ocr_text = "\n".join(_ocr_image(image) for image in images)
+        pages.append({"page": number, "text": ocr_text or text, "ocr": True})
+    return pages
+
+def _extract_image(path: str) -> List[Dict]:
+    from PIL import Image
+    with Image.open(path) as image:
+        return [{"page": 1, "text": _ocr_image(image), "ocr": True}]
+
+def _extract_generic(path: str) -> List[Dict]:
+    from langchain_community.document_loaders import UnstructuredFileLoader
+    return [{"page": None, "text": doc.page_content, "ocr": False} for doc in UnstructuredFileLoader(path).load()]
+
+def _cache_path(file_hash: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{file_hash}.v{CACHE_SCHEMA_VERSION}.json")
+
+def load_cached(file_hash: str, cache_dir: str = config.EXTRACTION_CACHE_DIR) -> Optional[Dict]:
+    """The cached extraction result for this content hash, or None."""
+    try:
+        with open(_cache_path(file_hash, cache_dir), "r", encoding="utf-8") as f:
+            return dict(json.load(f), cached=True)
+    except FileNotFoundError:
+        return None
+
+def _store(result: Dict, file_hash: str, cache_dir: str):
+    cache_path = _cache_path(file_hash, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, cache_path)
+
+def _with_assets(cached: Dict, path: str, file_hash: str, index_dir: str, cache_dir: str) -> Dict:
+    """Re-extract the figures of a cache hit whose image assets are not in `index_dir` (no OCR needed)."""
+    if assets_present(cached["figures"], index_dir):
+        return cached
+    figures = extract_figures(path, file_hash, cached["pages"], index_dir, config.FIGURE_THUMBNAIL_PX)
+    result = {"pages": cached["pages"], "ocr_pages": cached["ocr_pages"], "figures": figures}
+    _store(result, file_hash, cache_dir)
+    return dict(result, cached=True)
+
+def extract_file(path: str, file_hash: str, index_dir: str, cache_dir: str = config.EXTRACTION_CACHE_DIR) -> Dict:
+    """Extract the text, figures and tables of one file, reusing the cached result for the same content hash.
+
+    PDFs use their text layer and only OCR pages without one; images are OCR'd;
+    other formats go through unstructured. Figure images are saved inside the index
+    directory `index_dir`, and re-created there for cached results if missing.
+    """
+    cached = load_cached(file_hash, cache_dir)
+    if cached is not None:
+        return _with_assets(cached, path, file_hash, index_dir, cache_dir)
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PDF_EXTENSIONS:
+        pages = _extract_pdf(path)
+    elif extension in IMAGE_EXTENSIONS:
+        pages = _extract_image(path)
+    else:
+        pages = _extract_generic(path)
+    figures = extract_figures(path, file_hash, pages, index_dir, config.FIGURE_THUMBNAIL_PX)
+    result = {"pages": pages, "ocr_pages": sum(1 for p in pages if p["ocr"]), "figures": figures}
+    _store(result, file_hash, cache_dir)
+    return dict(result, cached=False)
+
+def extract_files(files: List[Tuple[str, str, str]], index_dir: str, on_done: Optional[Callable[[str, Dict], None]] = None,
+                  max_workers: int = config.EXTRACT_WORKERS) -> Dict[str, Dict]:
+    """Extract (rel_path, full_path, file_hash) triples on a process pool sized to the cores.
+
+    Cached results are returned first; the pool is only started for files that need extracting.
+    """
+    results = {}
+    pending = []
+    for rel_path, full_path, file_hash in files:
+        cached = load_cached(file_hash)
+        if cached is None:
+            pending.append((rel_path, full_path, file_hash))
+            continue
+        results[rel_path] = _with_assets(cached, full_path, file_hash, index_dir, config.EXTRACTION_CACHE_DIR)
+        if on_done is not None:
+            on_done(rel_path, results[rel_path])
+    if not pending:
+        return results
+    import pytesseract
+    workers = min(max_workers or os.cpu_count() or 1, len(pending))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_configure_worker,
+                             initargs=(pytesseract.pytesseract.tesseract_cmd,)) as pool:
+        futures = {pool.submit(extract_file, full_path, file_hash, index_dir): rel_path for rel_path, full_path, file_hash in pending}
+        for future in as_completed(futures):
+            rel_path = futures[future]
+            results[rel_path] = future.result()
+            if on_done is not None:
+                on_done(rel_path, results[rel_path])
+    return results
@@ -0,0 +1,263 @@
+import logging
+import os
+import re
+import io
+import json
+import hashlib
+import zipfile
+import threading
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+from bm25_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+FIGURE_INDEX_FILENAME = "figure_index.json"
+FIGURE_EMBEDDINGS_FILENAME = "figure_embeddings.npy"
+# Image assets live inside the index version directory, so retired versions take theirs with them.
+FIGURE_ASSETS_DIRNAME = "figure_assets"
+FIGURE_CAPTION = re.compile(r"^\s*(fig(?:ure)?\.?\s*\d+[a-z]?)\b[.:\-–]?\s*(.*)$", re.IGNORECASE)
+TABLE_CAPTION = re.compile(r"^\s*(table\s*\d+[a-z]?)\b[.:\-–]?\s*(.*)$", re.IGNORECASE)
+TABLE_CELL_SPLIT = re.compile(r"\t|\s{2,}")
+WORD_NS = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif"}
+
+def _captions(text: str, pattern) -> List[str]:
+    return [" ".join(line.split()) for line in text.splitlines() if pattern.match(line)]
+
+def _save_asset(data: bytes, index_dir: str, asset_dir: str, name: str, thumbnail_px: int) -> Optional[Dict[str, str]]:
+    """Write an embedded image and a pre-rendered PNG thumbnail next to it under index_dir/asset_dir.
+
+    The returned paths are relative to `index_dir`.
+    """
+    from PIL import Image
+    os.makedirs(os.path.join(index_dir, asset_dir), exist_ok=True)
+    relative = os.path.join(asset_dir, name)
+    relative_thumbnail = f"{os.path.splitext(relative)[0]}_thumb.png"
+    path, thumbnail_path = os.path.join(index_dir, relative), os.path.join(index_dir, relative_thumbnail)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            if not os.path.exists(path):
+                image.save(path)
+            if not os.path.exists(thumbnail_path):
+                thumb = image.convert("RGB") if image.mode not in ("RGB", "L") else image.copy()
+                thumb.thumbnail((thumbnail_px, thumbnail_px))
+                thumb.save(thumbnail_path, "PNG")
+    except Exception as e:
+        logger.debug(f"  -> Skipping unreadable image {name}: {e}")
+        return None
+    return {"path": relative, "thumbnail": relative_thumbnail}
+
+def _rows_after(lines: List[str], start: int) -> List[List[str]]:
+    """Rows of a text-layer table: the lines under a caption whose cells are split by tabs or wide gaps."""
+    rows = []
+    for line in lines[start + 1:]:
+        cells = [cell.strip() for cell in TABLE_CELL_SPLIT.split(line.strip()) if cell.strip()]
+        if len(cells) < 2 or FIGURE_CAPTION.match(line) or TABLE_CAPTION.match(line):
+            if rows:
+                break
+            continue
+        rows.append(cells)
+    return rows if len(rows) >= 2 else []
+
+def _pdf_figures(path: str, pages: List[Dict], index_dir: str, asset_dir: str, thumbnail_px: int) -> List[Dict]:
+    from pypdf import PdfReader
+    text_by_page = {page["page"]: page["text"] for page in pages}
+    figures = []
+    for number, page in enumerate(PdfReader(path).pages, start=1):
+        text = text_by_page.get(number, "")
+        captions = _captions(text, FIGURE_CAPTION)
+        try:
+            images = list(page.images)
+        except Exception as e:
+            logger.debug(f"  -> Could not read images on page {number} of {path}: {e}")
+            images = []
+        for i, image in enumerate(images):
+            extension = os.path.splitext(image.name)[1] or ".png"
+            asset = _save_asset(image.data, index_dir, asset_dir, f"p{number}_{i}{extension}", thumbnail_px)
+            if asset is None:
+                continue
+            caption = captions[i] if i < len(captions) else f"Figure on page {number}"
+            figures.append(dict(asset, type="image", page=number, caption=caption, context=text[:500]))
+        lines = text.splitlines()
+        for i, line in enumerate(lines):
+            if TABLE_CAPTION.match(line):
+                figures.append({"type": "table", "page": number, "caption": " ".join(line.split()),
+                                "data": _rows_after(lines, i), "context": text[:500]})
+    return figures
+
+def _docx_figures(path: str, index_dir: str, asset_dir: str, thumbnail_px: int) -> List[Dict]:
+    figures = []
+    with zipfile.ZipFile(path) as docx:
+        body = ET.fromstring(docx.read("word/document.xml")).find("w:body", WORD_NS)
+        paragraphs, tables = [], []
+        previous_text = ""
+        for element in list(body) if body is not None else []:
+            if element.tag == f"{{{WORD_NS['w']}}}p":
+                previous_text = "".join(t.text or "" for t in element.iter(f"{{{WORD_NS['w']}}}t")).strip()
+                paragraphs.append(previous_text)
+            elif element.tag == f"{{{WORD_NS['w']}}}tbl":
+                rows = []
+                for row in element.iter(f"{{{WORD_NS['w']}}}tr"):
+                    rows.append(["".join(t.text or "" for t in cell.iter(f"{{{WORD_NS['w']}}}t")).strip()
+                                 for cell in row.iter(f"{{{WORD_NS['w']}}}tc")])
+                tables.append((previous_text, rows, len(paragraphs)))
+        text = "\n".join(paragraphs)
+        for previous, rows, position in tables:
+            following = paragraphs[position] if position < len(paragraphs) else ""
+            caption = next((c for c in (previous, following) if TABLE_CAPTION.match(c)), f"Table {len(figures) + 1}")
+            figures.append({"type": "table", "page": None, "caption": caption, "data": rows, "context": previous})
+        captions = _captions(text, FIGURE_CAPTION)
+        media = sorted(name for name in docx.namelist()
+                       if name.startswith("word/media/") and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        for i, name in enumerate(media):
+            asset = _save_asset(docx.read(name), index_dir, asset_dir, os.path.basename(name), thumbnail_px)
+            if asset is not None:
+                caption = captions[i] if i < len(captions) else f"Image {i + 1}"
+                figures.append(dict(asset, type="image", page=None, caption=caption, context=""))
+    return figures
+
+def _image_figure(path: str, pages: List[Dict], index_dir: str, asset_dir: str, thumbnail_px: int) -> List[Dict]:
+    with open(path, "rb") as f:
+        asset = _save_asset(f.read(), index_dir, asset_dir, os.path.basename(path), thumbnail_px)
+    if asset is None:
+        return []
+    ocr_text = pages[0]["text"] if pages else ""
+    caption = next(iter(_captions(ocr_text, FIGURE_CAPTION)), None)
+    if caption is None:
+        caption = re.sub(r"[-_]+", " ", os.path.splitext(os.path.basename(path))[0]).strip()
+    return [dict(asset, type="image", page=1, caption=caption, context=ocr_text[:500])]
+
+def extract_figures(path: str, file_hash: str, pages: List[Dict], index_dir: str, thumbnail_px: int) -> List[Dict]:
+    """Images and tables in one file with caption and page.
+
+    Embedded images are saved under index_dir/figure_assets/<hash>; their paths are relative to `index_dir`.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    asset_dir = os.path.join(FIGURE_ASSETS_DIRNAME, file_hash)
+    try:
+        if extension == ".pdf":
+            return _pdf_figures(path, pages, index_dir, asset_dir, thumbnail_px)
+        if extension == ".docx":
+            return _docx_figures(path, index_dir, asset_dir, thumbnail_px)
+        if extension in IMAGE_EXTENSIONS:
+            return _image_figure(path, pages, index_dir, asset_dir, thumbnail_px)
+    except Exception as e:
+        logger.warning(f"  -> Figure/table extraction failed for {path}: {e}")
+    return []
+
+def _asset_paths(figure: Dict) -> List[str]:
+    return [figure[key] for key in ("path", "thumbnail") if figure.get(key)]
+
+def assets_present(figures: List[Dict], index_dir: str) -> bool:
+    """Whether every image asset of `figures` is stored inside `index_dir`."""
+    return all(not os.path.isabs(path) and os.path.exists(os.path.join(index_dir, path))
+               for figure in figures for path in _asset_paths(figure))
+
+def figure_text(entry: Dict) -> str:
+    """What gets embedded and keyword-indexed for a figure: its caption plus nearby text."""
+    return f"{entry['caption']}\n{entry.get('context', '')}".strip()
+
+class FigureIndex:
+    """Figures and tables found at ingestion, searchable by caption embedding and keywords.
+
+    Entries are grouped by source file so re-ingesting or deleting a file replaces
+    its figures. Metadata is JSON and caption vectors a .npy matrix, both stored
+    next to the Chroma collection; image paths are relative to that directory, and
+    assets no entry references any more are deleted on `save()`.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._orphaned = set()
+        self.path = os.path.join(directory, FIGURE_INDEX_FILENAME)
+        self.embeddings_path = os.path.join(directory, FIGURE_EMBEDDINGS_FILENAME)
+        self._entries: List[Dict] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.RLock()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f).get("entries", [])
+            if os.path.exists(self.embeddings_path):
+                self._vectors = np.load(self.embeddings_path)
+            if len(self._vectors) != len(self._entries):
+                logger.warning("Figure index embeddings are out of sync with its entries. Starting an empty figure index.")
+                self._entries = []
+                self._vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def remove_file(self, source: str):
+        with self._lock:
+            keep = [i for i, entry in enumerate(self._entries) if entry["source"] != source]
+            self._orphaned.update(path for entry in self._entries if entry["source"] == source for path in _asset_paths(entry))
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep] if len(self._vectors) else self._vectors
+
+    def add_file(self, source: str, figures: List[Dict], embed_fn: Callable[[List[str]], List[List[float]]]):
+        with self._lock:
+            self.remove_file(source)
+            if not figures:
+                return
+            entries = []
+            for figure in figures:
+                key = f"{source}\0{figure['type']}\0{figure.get('page')}\0{figure['caption']}\0{len(entries)}"
+                entries.append(dict(figure, source=source, id=hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]))
+            vectors = np.asarray(embed_fn([figure_text(entry) for entry in entries]), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            if not len(self._entries):
+                self._vectors = vectors
+            elif self._vectors.shape[1] == vectors.shape[1]:
+                self._vectors = np.vstack([self._vectors, vectors])
+            else:
+                raise ValueError("Figure caption embeddings changed dimension; rebuild the index.")
+            self._entries.extend(entries)
+
+    def search(self, query: str, query_vector: Optional[Iterable[float]] = None, k: int = 3,
+               keyword_weight: float = 0.3) -> List[Dict]:
+        """Rank entries by caption cosine similarity plus a keyword-overlap bonus; returns copies with a score."""
+        with self._lock:
+            if not self._entries:
+                return []
+            scores = np.zeros(len(self._entries), dtype=np.float32)
+            if query_vector is not None and self._vectors.size:
+                vector = np.asarray(query_vector, dtype=np.float32)
+                scores += self._vectors @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+            terms = set(tokenize(query))
+            if terms:
+                for i, entry in enumerate(self._entries):
+                    caption_terms = set(tokenize(f"{entry['caption']} {os.path.basename(entry['source'])}"))
+                    scores[i] += keyword_weight * len(terms & caption_terms) / len(terms)
+            order = np.argsort(-scores)[:k]
+            results = []
+            for i in order:
+                entry = dict(self._entries[i], score=round(float(scores[i]), 4))
+                for key in ("path", "thumbnail"):
+                    if entry.get(key):
+                        entry[key] = os.path.join(self.directory, entry[key])
+                results.append(entry)
+            return results
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": self._entries}, f)
+            with open(f"{self.embeddings_path}.tmp", "wb") as f:
+                np.save(f, self._vectors)
+            os.replace(f"{self.embeddings_path}.tmp", self.embeddings_path)
+            os.replace(tmp_path, self.path)
+            referenced = {path for entry in self._entries for path in _asset_paths(entry)}
+            # Absolute paths predate per-version assets and point outside the index; leave them alone.
+            for path in self._orphaned - referenced:
+                if not os.path.isabs(path):
+                    try:
+                        os.remove(os.path.join(self.directory, path))
+                        os.rmdir(os.path.dirname(os.path.join(self.directory, path)))
+                    except OSError:
+                        pass
+            self._orphaned.clear()
@@ -0,0 +1,180 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, publish() still refuses a stale base.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILENAME = "CURRENT"
+WRITER_LOCK_FILENAME = "WRITER.lock"
+STAGING_MARKER = ".staging"
+VERSION_PREFIX = "v-"
+# Indexes written before versioning live directly in the root directory.
+LEGACY_VERSION = "."
+LEGACY_MARKER = "chroma.sqlite3"
+# Unpublished versions older than this were left behind by a crashed ingestion.
+ABANDONED_STAGING_SECONDS = 24 * 3600
+GC_INTERVAL_SECONDS = 60
+
+class ConcurrentPublishError(RuntimeError):
+    """Another writer published a version after the one a staged version was built from."""
+
+class IndexVersions:
+    """Immutable index versions under one root, published by atomically swapping a CURRENT pointer.
+
+    Ingestion copies the current version into a new `v-*` directory, updates the copy
+    and then replaces CURRENT with `os.replace`, so readers never see a half-built
+    index. Requests lease the version they read from; `gc()` deletes superseded
+    versions once no lease in this process holds them and they were retired more
+    than `grace_seconds` ago, which covers readers in other worker processes.
+    """
+
+    def __init__(self, root: str, grace_seconds: float):
+        self.root = root
+        self.grace_seconds = grace_seconds
+        self.pointer_path = os.path.join(root, CURRENT_FILENAME)
+        self._leases = Counter()
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+
+    def current(self) -> Optional[str]:
+        try:
+            with open(self.pointer_path, "r", encoding="utf-8") as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return LEGACY_VERSION if os.path.exists(os.path.join(self.root, LEGACY_MARKER)) else None
+        return name if os.path.isdir(self.path(name)) else None
+
+    def path(self, name: str) -> str:
+        return self.root if name == LEGACY_VERSION else os.path.join(self.root, name)
+
+    @contextmanager
+    def lease(self, name: Optional[str]):
+        """Keep version `name` from being garbage-collected while in use."""
+        if name is None:
+            yield name
+            return
+        with self._lock:
+            self._leases[name] += 1
+        try:
+            yield name
+        finally:
+            with self._lock:
+                self._leases[name] -= 1
+                if self._leases[name] <= 0:
+                    del self._leases[name]
+                due = time.time() - self._last_gc >= GC_INTERVAL_SECONDS
+            if due:
+                self.gc()
+
+    def _copy_ignore(self, directory: str, names: List[str]) -> List[str]:
+        if os.path.abspath(directory) != os.path.abspath(self.root):
+            return [n for n in names if n.endswith(".tmp")]
+        return [n for n in names if n in (CURRENT_FILENAME, WRITER_LOCK_FILENAME) or n.startswith(VERSION_PREFIX) or n.endswith(".tmp")]
+
+    @contextmanager
+    def writer_lock(self):
+        """Exclusive lock for stage-to-publish, shared by every thread and process using this root."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, WRITER_LOCK_FILENAME), "a") as f:
+            if fcntl is not None:
+                # flock locks belong to the open file, so threads of one process exclude each other too.
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield
+
+    @contextmanager
+    def stage(self, base: Optional[str]):
+        """Yield a new version directory, starting as a copy of `base` (empty if None).
+
+        The copy is a full one, so every ingestion costs I/O and, until gc, disk space
+        proportional to the whole index rather than to the change. The directory is
+        deleted on error and must be published with `publish()`.
+        """
+        name = f"{VERSION_PREFIX}{time.time_ns()}-{os.getpid()}"
+        path = self.path(name)
+        with self.lease(name):
+            with self.lease(base):
+                if base is None:
+                    os.makedirs(path)
+                else:
+                    shutil.copytree(self.path(base), path, ignore=self._copy_ignore)
+            open(os.path.join(path, STAGING_MARKER), "w").close()
+            logger.info(f"Staging index version {name} from {base or 'an empty index'}.")
+            try:
+                yield path
+            except BaseException:
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+
+    def publish(self, path: str, base: Optional[str]):
+        """Atomically make the staged version at `path` the current one.
+
+        Raises ConcurrentPublishError if CURRENT no longer points at `base`, the version
+        that was current when the staged one was planned.
+        """
+        current = self.current()
+        if current != base:
+            raise ConcurrentPublishError(f"Index version {current} was published while {os.path.basename(path)} was staged from {base}.")
+        name = os.path.basename(path)
+        os.remove(os.path.join(path, STAGING_MARKER))
+        tmp_path = f"{self.pointer_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.pointer_path)
+        logger.info(f"Published index version {name}.")
+        self.gc()
+
+    def gc(self) -> List[str]:
+        """Delete unleased versions retired more than `grace_seconds` ago and abandoned staging directories."""
+        with self._lock:
+            self._last_gc = time.time()
+            leased = set(self._leases)
+        current = self.current()
+        now = time.time()
+        try:
+            retired_for = now - os.path.getmtime(self.pointer_path)
+        except FileNotFoundError:
+            return []
+        removed = []
+        for name in os.listdir(self.root):
+            path = self.path(name)
+            if not name.startswith(VERSION_PREFIX) or name == current or name in leased or not os.path.isdir(path):
+                continue
+            marker = os.path.join(path, STAGING_MARKER)
+            if os.path.exists(marker):
+                if now - os.path.getmtime(marker) < ABANDONED_STAGING_SECONDS:
+                    continue
+            elif retired_for < self.grace_seconds:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(name)
+        if (current != LEGACY_VERSION and LEGACY_VERSION not in leased and retired_for >= self.grace_seconds
+                and os.path.exists(os.path.join(self.root, LEGACY_MARKER))):
+            for name in os.listdir(self.root):
+                if name.startswith(CURRENT_FILENAME) or name.startswith(VERSION_PREFIX) or name == WRITER_LOCK_FILENAME:
+                    continue
+                path = os.path.join(self.root, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            removed.append(LEGACY_VERSION)
+        if removed:
+            logger.info(f"Removed retired index version(s): {', '.join(removed)}")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            leases = dict(self._leases)
+        versions = [n for n in os.listdir(self.root) if n.startswith(VERSION_PREFIX)] if os.path.isdir(self.root) else []
+        return {"current": self.current(), "on_disk": sorted(versions), "leases": leases}
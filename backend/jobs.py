@@ -0,0 +1,157 @@
+import logging
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import config
+from metrics import Timings, track
+
+logger = logging.getLogger(__name__)
+
+INGESTION_STAGES = ["saved", "parsed", "ocr", "chunked", "embedded"]
+
+class Job:
+    def __init__(self, workspace: str):
+        self.id = uuid.uuid4().hex
+        self.workspace = workspace
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.timings = Timings()
+
+class IngestionJob(Job):
+    """Progress of one upload: per-file stage timestamps plus overall throughput."""
+
+    def __init__(self, filenames: List[str], workspace: str):
+        super().__init__(workspace)
+        self.files: Dict[str, Dict] = {}
+        self.chunks_embedded = 0
+        self.embedding: Optional[Dict] = None
+        self._lock = threading.Lock()
+        for filename in filenames:
+            self.mark(filename, "saved")
+
+    def mark(self, rel_path: str, stage: str, chunks: int = 0):
+        with self._lock:
+            entry = self.files.setdefault(rel_path, {"stage": None, "stages": {}})
+            entry["stage"] = stage
+            entry["stages"][stage] = round(time.time() - self.created_at, 3)
+            if stage == "embedded":
+                self.chunks_embedded += chunks
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            files_done = sum(1 for f in self.files.values() if f["stage"] in ("embedded", "unchanged"))
+            return {
+                "job_id": self.id,
+                "workspace": self.workspace,
+                "status": self.status,
+                "error": self.error,
+                "elapsed_seconds": round(elapsed, 3),
+                "files_total": len(self.files),
+                "files_done": files_done,
+                "chunks_embedded": self.chunks_embedded,
+                "files_per_second": round(files_done / elapsed, 3) if elapsed else 0.0,
+                "chunks_per_second": round(self.chunks_embedded / elapsed, 3) if elapsed else 0.0,
+                "embedding": self.embedding,
+                "timings": self.timings.to_dict(),
+                "files": {name: dict(entry, stages=dict(entry["stages"])) for name, entry in self.files.items()},
+            }
+
+class ReportJob(Job):
+    """A report being generated, with an append-only log of per-section events."""
+
+    def __init__(self, request: str, workspace: str):
+        super().__init__(workspace)
+        self.request = request
+        self.events: List[Dict] = []
+        self.pdf_path: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def emit(self, event_type: str, **data):
+        with self._lock:
+            self.events.append({"seq": len(self.events), "type": event_type,
+                                "elapsed": round(time.time() - self.created_at, 3), **data})
+
+    @property
+    def has_pdf(self) -> bool:
+        return bool(self.pdf_path and os.path.exists(self.pdf_path))
+
+    def events_since(self, seq: int) -> List[Dict]:
+        with self._lock:
+            return list(self.events[seq:])
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "workspace": self.workspace,
+                "status": self.status,
+                "error": self.error,
+                "request": self.request,
+                "elapsed_seconds": round((self.finished_at or time.time()) - self.created_at, 3),
+                "events": list(self.events),
+                "timings": self.timings.to_dict(),
+                "download_url": f"/reports/{self.id}/pdf" if self.has_pdf else None,
+            }
+
+class JobManager:
+    """Runs background jobs off the event loop on a bounded worker pool.
+
+    Ingestion runs on INGEST_JOB_WORKERS workers. Jobs for the same workspace share its
+    manifest and index, so each holds `WorkspaceManager.ingest_lock(workspace)` (and the
+    index's cross-process `IndexVersions.writer_lock()`) and they run one after another; jobs for different workspaces run in parallel. Queries keep
+    using the current index version meanwhile.
+    """
+
+    def __init__(self, name: str, max_workers: int = 1, max_finished_jobs: int = 100):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+        self.max_finished_jobs = max_finished_jobs
+
+    def submit(self, job: Job, work: Callable[[Job], None]) -> Job:
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def register(self, job: Job) -> Job:
+        """Track a job that finished without running on the pool (e.g. one served from a cache)."""
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, work: Callable[[Job], None]):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            with track(job.timings):
+                work(job)
+            job.status = "completed"
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job.id]
+
+ingestion_jobs = JobManager("ingest", max_workers=config.INGEST_JOB_WORKERS)
+report_jobs = JobManager("report", max_workers=config.REPORT_JOB_WORKERS)
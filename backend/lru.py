@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+class LRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
+
+class RetrievalMemo(LRUCache):
+    """Top-k results keyed by (k, query), valid for one index version at a time."""
+
+    def __init__(self, max_entries: int):
+        super().__init__(max_entries)
+        self.index_version = None
+
+    def lookup(self, index_version, query: str, k: int):
+        if index_version != self.index_version:
+            self.clear()
+            self.index_version = index_version
+        return self.get((k, " ".join(query.split())))
+
+    def store(self, index_version, query: str, k: int, docs: List[Any]):
+        if index_version == self.index_version:
+            self.put((k, " ".join(query.split())), docs)
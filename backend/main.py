@@ -1,15 +1,30 @@
 
 import os
+import logging
+import json
+import asyncio
 import shutil
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List
-from fastapi.responses import FileResponse
-import report_generator
+from contextlib import asynccontextmanager
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 import time
-import rag_module as rag
-import graph
+from jobs import ingestion_jobs, report_jobs, IngestionJob, ReportJob
+from resources import models
+from workspaces import workspaces, Workspace, InvalidWorkspaceError, DEFAULT_WORKSPACE
+import config
+from concurrency import generation_limiter, QueueFullError
+from report_store import report_store
+from warmup import warm_up, warm_up_in_background, readiness
+import metrics
+from metrics import span, track, Timings, current_timings
+from context_builder import build_context
+
+logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -21,75 +36,186 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-rag_chain = None
-try:
-    if os.path.exists(rag.CHROMA_PATH):
-        print("ChromaDB found. Initializing RAG chain...")
-        rag_chain = rag.get_rag_chain()
-        print("RAG chain initialized successfully.")
-    else:
-        print("ChromaDB not found on startup. Upload documents to initialize.")
-except Exception as e:
-    print(f"Error initializing RAG chain on startup: {e}")
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    timings = Timings()
+    started = time.perf_counter()
+    status = 500
+    try:
+        with track(timings):
+            response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.REQUESTS.inc(route=route, method=request.method, status=status)
+        metrics.REQUEST_SECONDS.observe(elapsed, route=route, method=request.method)
+    breakdown = timings.server_timing()
+    response.headers["Server-Timing"] = f"{breakdown + ', ' if breakdown else ''}total;dur={elapsed * 1000:.1f}"
+    logger.debug(f"{request.method} {route} {status} in {elapsed:.3f}s {timings.to_dict()}")
+    return response
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+def start_warmup():
+    ws = workspaces.get(DEFAULT_WORKSPACE)
+    if not ws.registry.has_index():
+        logger.info("ChromaDB not found on startup. Upload documents to initialize.")
+    elif ws.registry.backend_error():
+        logger.warning(ws.registry.backend_error())
+        _queue_rebuild(ws)
+    if config.WARMUP_ON_STARTUP:
+        warm_up_in_background()
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Healthcare AI Assistant API"}
 
+@app.post("/warmup")
+async def warmup_endpoint():
+    return await run_in_threadpool(warm_up)
+
+@app.get("/ready")
+def ready_endpoint():
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+def _workspace(workspace_id: str) -> Workspace:
+    try:
+        return workspaces.get(workspace_id)
+    except InvalidWorkspaceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/workspaces")
+def list_workspaces():
+    return {"workspaces": workspaces.list(), **workspaces.stats()}
+
+def _save_upload(file: UploadFile, file_path: str):
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
 @app.post("/upload/")
-async def upload_files(files: List[UploadFile] = File(...)):
-    print(f"Received {len(files)} files for upload.")
+async def upload_files(files: List[UploadFile] = File(...), workspace: str = Form(DEFAULT_WORKSPACE)):
+    ws = _workspace(workspace)
+    logger.info(f"Received {len(files)} files for upload to workspace '{ws.id}'.")
 
-    if os.path.exists(rag.DATA_PATH):
-        print(f"Clearing existing data path: {rag.DATA_PATH}")
-        shutil.rmtree(rag.DATA_PATH)
-    os.makedirs(rag.DATA_PATH)
-    print(f"Created data path: {rag.DATA_PATH}")
+    os.makedirs(ws.data_path, exist_ok=True)
 
     saved_files = []
     for file in files:
-        file_path = os.path.join(rag.DATA_PATH, file.filename)
+        file_path = os.path.join(ws.data_path, file.filename)
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            print(f"Successfully saved file: {file.filename}")
+            await run_in_threadpool(_save_upload, file, file_path)
+            logger.debug(f"Saved upload: {file.filename}")
             saved_files.append(file.filename)
         except Exception as e:
-            print(f"Error saving file {file.filename}: {e}")
+            logger.error(f"Error saving file {file.filename}: {e}")
             raise HTTPException(status_code=500, detail=f"Error saving file '{file.filename}': {e}")
         finally:
             file.file.close()
 
-    global rag_chain
-    try:
-        print("Starting document processing...")
-        rag.process_documents()
-        print("Document processing finished. Re-initializing RAG chain...")
-        rag_chain = rag.get_rag_chain()
-        print("RAG chain re-initialized successfully.")
-    except Exception as e:
-        print(f"Error processing documents or initializing RAG chain: {e}")
-        rag_chain = None
-        raise HTTPException(status_code=500, detail=f"Error processing documents: {e}")
+    job = ingestion_jobs.submit(IngestionJob(saved_files, ws.id), _run_ingestion)
+    logger.info(f"Queued ingestion job {job.id} for {len(saved_files)} file(s).")
+    return {
+        "message": f"Successfully uploaded {len(saved_files)} files. Processing in the background.",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+    }
+
+def _run_ingestion(job):
+    import rag_module as rag
+    workspace = workspaces.get(job.workspace)
+    logger.info(f"Starting document processing for job {job.id} in workspace '{workspace.id}'...")
+    # One ingestion per workspace at a time; other workspaces ingest in parallel.
+    with workspaces.ingest_lock(workspace.id):
+        job.embedding = rag.process_documents(progress=job.mark, workspace=workspace)
+    for filename, entry in job.to_dict()["files"].items():
+        if entry["stage"] == "saved":
+            job.mark(filename, "unchanged")
+    logger.info("Document processing finished.")
 
-    return {"message": f"Successfully uploaded and processed {len(saved_files)} files."}
+_rebuild_jobs = {}
+
+def _queue_rebuild(ws: Workspace) -> IngestionJob:
+    """Queue one ingestion that rebuilds the workspace's index for the configured VECTOR_BACKEND."""
+    job = _rebuild_jobs.get(ws.id)
+    if job is None or job.status in ("completed", "failed"):
+        job = _rebuild_jobs[ws.id] = ingestion_jobs.submit(IngestionJob([], ws.id), _run_ingestion)
+        logger.info(f"Queued index rebuild job {job.id} for workspace '{ws.id}'.")
+    return job
+
+def _require_vectors(ws: Workspace):
+    error = ws.registry.backend_error()
+    if error:
+        job = _queue_rebuild(ws)
+        raise HTTPException(status_code=503, detail=f"{error} Rebuild job: /jobs/{job.id}.")
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job.to_dict()
+
+def _queue_full(e: QueueFullError) -> HTTPException:
+    logger.warning(f"Rejecting request: {e}")
+    return HTTPException(status_code=429, detail="The assistant is busy. Please retry shortly.", headers={"Retry-After": str(e.retry_after)})
+
+@asynccontextmanager
+async def _generation_slot():
+    try:
+        await generation_limiter.acquire()
+    except QueueFullError as e:
+        raise _queue_full(e)
+    try:
+        yield
+    finally:
+        generation_limiter.release()
 
 class ChatRequest(BaseModel):
     query: str
+    workspace: str = DEFAULT_WORKSPACE
+
+def _sources(docs):
+    return [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+
+async def _cached_answer(ws: Workspace, query: str, index_version):
+    with span("answer_cache_lookup"):
+        return await run_in_threadpool(ws.answer_cache.lookup, query, index_version, models.get_embeddings().embed_query)
 
 @app.post("/chat/")
 async def chat_with_docs(request: ChatRequest):
-    global rag_chain
-    if rag_chain is None:
-        print("Error: /chat called but RAG chain is not initialized.")
+    ws = _workspace(request.workspace)
+    if not ws.registry.has_index():
+        logger.warning("/chat called before any documents were indexed.")
         raise HTTPException(status_code=503, detail="Assistant is not ready. Please upload documents first.")
-    print(f"Received query for /chat: {request.query}")
+    _require_vectors(ws)
+    logger.info(f"Received query for /chat: {request.query}")
     try:
-        answer = rag_chain.invoke(request.query)
-        print(f"Generated RAG answer: {answer}")
-        return {"answer": answer}
+        # One index version serves the whole request, even if ingestion publishes a newer one meanwhile.
+        with ws.registry.lease() as index:
+            index_version = index.version
+            cached, embedding = await _cached_answer(ws, request.query, index_version)
+            if cached is not None:
+                logger.info("Answer served from cache.")
+                return {"answer": cached["answer"], "cached": True, "timings": current_timings().to_dict()}
+            async with _generation_slot():
+                docs = await index.get_retriever().ainvoke(request.query)
+                with span("prompt_build"):
+                    context, context_stats = build_context(docs)
+                    prompt = models.get_prompt().invoke({"context": context, "question": request.query})
+                with span("llm_generate"):
+                    answer = await models.get_generation_chain().ainvoke(prompt)
+        ws.answer_cache.store(request.query, embedding, {"answer": answer, "sources": _sources(docs)}, index_version)
+        logger.debug(f"Generated RAG answer ({len(answer)} chars)")
+        return {"answer": answer, "context": context_stats, "timings": current_timings().to_dict()}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error during RAG chain invocation: {e}")
+        logger.exception(f"Error during RAG chain invocation: {e}")
         error_detail = f"Error generating response: {e}"
         if "model runner has unexpectedly stopped" in str(e):
             error_detail = "Error generating response: The language model failed, possibly due to resource limits."
@@ -97,44 +223,204 @@ async def chat_with_docs(request: ChatRequest):
         else:
             raise HTTPException(status_code=500, detail=error_detail)
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _stream_cached(cached):
+    yield _sse("sources", cached["sources"])
+    yield _sse("token", {"token": cached["answer"]})
+    yield _sse("done", {"cached": True})
+
+async def _stream_answer(ws: Workspace, query: str, embedding, timings: Timings):
+    # The slot is taken here rather than in the endpoint: if the client goes away before
+    # the body is iterated, this generator never runs and nothing is left to release.
+    try:
+        await generation_limiter.acquire()
+    except QueueFullError as e:
+        yield _sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        return
+    try:
+        # Leased here for the same reason; the answer is cached under the version it was built from.
+        with ws.registry.lease() as index:
+            index_version = index.version
+            docs = await index.get_retriever().ainvoke(query)
+        sources = _sources(docs)
+        yield _sse("sources", sources)
+        tokens = []
+        with span("prompt_build"):
+            context, context_stats = build_context(docs)
+            prompt = models.get_prompt().invoke({"context": context, "question": query})
+        with span("llm_generate"):
+            async for token in models.get_generation_chain().astream(prompt):
+                tokens.append(token)
+                yield _sse("token", {"token": token})
+        ws.answer_cache.store(query, embedding, {"answer": "".join(tokens), "sources": sources}, index_version)
+        yield _sse("done", {"context": context_stats, "timings": timings.to_dict()})
+    except Exception as e:
+        logger.exception(f"Error during streamed RAG generation: {e}")
+        error_detail = f"Error generating response: {e}"
+        if "model runner has unexpectedly stopped" in str(e):
+            error_detail = "Error generating response: The language model failed, possibly due to resource limits."
+        yield _sse("error", {"detail": error_detail})
+    finally:
+        generation_limiter.release()
+
+@app.post("/chat/stream/")
+async def chat_with_docs_stream(request: ChatRequest):
+    ws = _workspace(request.workspace)
+    if not ws.registry.has_index():
+        logger.warning("/chat/stream called before any documents were indexed.")
+        raise HTTPException(status_code=503, detail="Assistant is not ready. Please upload documents first.")
+    _require_vectors(ws)
+    logger.info(f"Received query for /chat/stream: {request.query}")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    cached, embedding = await _cached_answer(ws, request.query, ws.registry.version)
+    if cached is not None:
+        logger.info("Streaming answer from cache.")
+        return StreamingResponse(_stream_cached(cached), media_type="text/event-stream", headers=headers)
+    try:
+        generation_limiter.check_capacity()
+    except QueueFullError as e:
+        raise _queue_full(e)
+    return StreamingResponse(
+        _stream_answer(ws, request.query, embedding, current_timings()),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return {"embedding_cache": models.get_embedding_cache().stats(), "report_store": report_store.stats(),
+            "workspaces": workspaces.stats(), **models.cache_stats()}
+
 class ReportRequest(BaseModel):
     request: str
+    workspace: str = DEFAULT_WORKSPACE
 
-@app.post("/generate_report/")
+@app.post("/generate_report/", status_code=202)
 async def generate_report_endpoint(request: ReportRequest):
-    print(f"Received report request for /generate_report: {request.request}")
-    if rag_chain is None:
-        print("Error: /generate_report called but RAG chain not initialized.")
+    logger.info(f"Received report request for /generate_report: {request.request}")
+    ws = _workspace(request.workspace)
+    if not ws.registry.has_index():
+        logger.warning("/generate_report called before any documents were indexed.")
         raise HTTPException(status_code=503, detail="Cannot generate report. Please upload documents first.")
-    pdf_filepath = None
-    try:
-        print("Invoking agentic graph for report generation...")
-        report_content_text = graph.run_graph(request.request)
-        print(f"Graph generation finished. Raw content length: {len(report_content_text)}")
-        report_data_for_pdf = {"report_text": report_content_text}
-        timestamp = int(time.time())
-        temp_dir = "temp_reports"
-        os.makedirs(temp_dir, exist_ok=True)
-        pdf_filename = f"report_{timestamp}.pdf"
-        pdf_filepath = os.path.join(temp_dir, pdf_filename)
-        print(f"Generating PDF: {pdf_filepath}")
-        generated_path = report_generator.create_report_pdf(report_data_for_pdf, pdf_filepath)
-        if generated_path and os.path.exists(generated_path):
-            print(f"Sending PDF file: {generated_path}")
-            return FileResponse(
-                path=generated_path,
-                media_type='application/pdf',
-                filename=f"generated_report_{timestamp}.pdf",
-            )
-        else:
-            print(f"Error: PDF file not found after generation attempt: {generated_path}")
-            raise HTTPException(status_code=500, detail="Failed to generate or locate the PDF report after creation.")
-    except Exception as e:
-        print(f"Error during report generation endpoint: {e}")
-        error_detail = f"Error generating report: {e}"
-        if "model runner has unexpectedly stopped" in str(e):
-            error_detail = "Error generating report: The language model failed, possibly due to resource limits."
-            raise HTTPException(status_code=503, detail=error_detail)
+    _require_vectors(ws)
+    cache_key = report_store.key(request.request, ws.id, ws.registry.version)
+    cached_path = report_store.get(cache_key)
+    if cached_path is not None:
+        job = report_jobs.register(_cached_report_job(request.request, ws.id, cached_path))
+        logger.info(f"Report cache hit for job {job.id}: {cached_path}")
+    else:
+        try:
+            generation_limiter.check_capacity()
+        except QueueFullError as e:
+            raise _queue_full(e)
+        loop = asyncio.get_running_loop()
+        job = report_jobs.submit(ReportJob(request.request, ws.id), lambda job: _run_report(job, loop, cache_key))
+        logger.info(f"Queued report job {job.id}.")
+    return {
+        "job_id": job.id,
+        "status_url": f"/reports/{job.id}",
+        "events_url": f"/reports/{job.id}/events",
+        "download_url": f"/reports/{job.id}/pdf",
+    }
+
+def _cached_report_job(request: str, workspace: str, path: str) -> ReportJob:
+    """A report job completed on the spot from the report store, without a worker slot."""
+    job = ReportJob(request, workspace)
+    job.pdf_path = path
+    job.started_at = job.finished_at = time.time()
+    job.emit("completed", duration=0.0, cached=True, download_url=f"/reports/{job.id}/pdf")
+    job.status = "completed"
+    return job
+
+def _run_report(job: ReportJob, loop, cache_key: str):
+    import graph
+    import report_generator
+    workspace = workspaces.get(job.workspace)
+    # Held until the PDF is written: figure images are read from the leased version's directory.
+    with workspace.registry.lease():
+        try:
+            logger.info("Invoking agentic graph for report generation...")
+            # Each LLM call in the graph takes its own slot, so parallel tools and summary
+            # map/reduce calls count against LLM_MAX_CONCURRENCY like chat requests do.
+            with generation_limiter.bound_to(loop):
+                report_data_for_pdf = graph.run_graph(job.request, progress=job.emit, workspace=workspace)
+        except Exception as e:
+            if "model runner has unexpectedly stopped" in str(e):
+                raise RuntimeError("The language model failed, possibly due to resource limits.") from e
+            raise
+        logger.info(f"Graph generation finished. Sections: {len(report_data_for_pdf)}")
+        job.emit("rendering")
+        started = time.perf_counter()
+        if config.REPORT_IN_MEMORY:
+            # The rendered bytes only live until they are stored; finished jobs are served from disk.
+            pdf_bytes = report_generator.render_report_pdf(report_data_for_pdf)
+            if not pdf_bytes:
+                raise RuntimeError("Failed to generate the PDF report.")
+            job.pdf_path = report_store.put(cache_key, pdf_bytes)
         else:
-            raise HTTPException(status_code=500, detail=error_detail)
+            temp_path = report_store.temp_path()
+            logger.info(f"Generating PDF: {temp_path}")
+            generated_path = report_generator.create_report_pdf(report_data_for_pdf, temp_path)
+            if not generated_path or not os.path.exists(generated_path):
+                raise RuntimeError("Failed to generate or locate the PDF report after creation.")
+            job.pdf_path = report_store.commit(cache_key, generated_path)
+    job.emit("completed", duration=round(time.perf_counter() - started, 3), download_url=f"/reports/{job.id}/pdf")
 
+def _get_report_job(job_id: str) -> ReportJob:
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Report job '{job_id}' not found.")
+    return job
+
+@app.get("/reports/{job_id}")
+def get_report_status(job_id: str):
+    return _get_report_job(job_id).to_dict()
+
+async def _report_events(job: ReportJob):
+    seq = 0
+    while True:
+        finished = job.finished_at is not None
+        for event in job.events_since(seq):
+            seq += 1
+            yield _sse(event["type"], event)
+        if finished:
+            if job.status == "failed":
+                yield _sse("failed", {"error": job.error})
+            break
+        await asyncio.sleep(0.5)
+
+@app.get("/reports/{job_id}/events")
+async def stream_report_events(job_id: str):
+    job = _get_report_job(job_id)
+    return StreamingResponse(
+        _report_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _read_chunks(f, size: int = 64 * 1024):
+    with f:
+        while chunk := f.read(size):
+            yield chunk
+
+@app.get("/reports/{job_id}/pdf")
+def download_report(job_id: str):
+    job = _get_report_job(job_id)
+    # has_pdf alone: the "completed" event is emitted as soon as the PDF exists, before the job's status flips.
+    if not job.has_pdf:
+        if job.status == "completed":
+            raise HTTPException(status_code=410, detail="The report file has expired from the report store. Please generate it again.")
+        raise HTTPException(status_code=409, detail=f"Report is not ready (status: {job.status}).")
+    # Opened here so an eviction from the report store between the check and the send can't break the response.
+    try:
+        pdf = open(job.pdf_path, "rb")
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="The report file has expired from the report store. Please generate it again.")
+    filename = f"generated_report_{int(job.created_at)}.pdf"
+    return StreamingResponse(
+        _read_chunks(pdf),
+        media_type='application/pdf',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Content-Length": str(os.fstat(pdf.fileno()).st_size)},
+    )
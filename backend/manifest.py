@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Tuple
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_chunk(text: str, metadata: Dict) -> str:
+    digest = hashlib.sha256()
+    digest.update(text.encode("utf-8"))
+    digest.update(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def scan_files(data_path: str) -> List[str]:
+    rel_paths = []
+    if not os.path.isdir(data_path):
+        return rel_paths
+    for root, _, filenames in os.walk(data_path):
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            rel_paths.append(os.path.relpath(full_path, data_path).replace(os.sep, "/"))
+    return sorted(rel_paths)
+
+class IngestionManifest:
+    """Content hashes of every ingested file and of the chunks it produced.
+
+    Stored next to the Chroma collection so the two always describe the same index.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self.files: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.version = data.get("version", 0)
+            self.files = data.get("files", {})
+
+    def plan(self, data_path: str) -> Tuple[Dict[str, Dict], Dict[str, Dict], List[str]]:
+        """Compare files on disk with the manifest.
+
+        Returns (to_ingest, unchanged, removed). Hashing is skipped for files whose
+        size and mtime match the recorded entry.
+        """
+        to_ingest, unchanged = {}, {}
+        on_disk = scan_files(data_path)
+        on_disk_set = set(on_disk)
+        for rel_path in on_disk:
+            full_path = os.path.join(data_path, rel_path)
+            stat = os.stat(full_path)
+            entry = self.files.get(rel_path)
+            if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+                unchanged[rel_path] = entry
+                continue
+            file_hash = hash_file(full_path)
+            info = {"hash": file_hash, "size": stat.st_size, "mtime": stat.st_mtime}
+            if entry and entry.get("hash") == file_hash:
+                entry.update(info)
+                unchanged[rel_path] = entry
+            else:
+                to_ingest[rel_path] = info
+        removed = [rel_path for rel_path in self.files if rel_path not in on_disk_set]
+        return to_ingest, unchanged, removed
+
+    def chunk_hashes(self, rel_path: str) -> Dict[str, str]:
+        return dict(self.files.get(rel_path, {}).get("chunks", {}))
+
+    def record_file(self, rel_path: str, info: Dict, chunks: Dict[str, str]):
+        self.files[rel_path] = {**info, "chunks": chunks}
+
+    def remove_file(self, rel_path: str) -> List[str]:
+        entry = self.files.pop(rel_path, None)
+        return list(entry.get("chunks", {}).keys()) if entry else []
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
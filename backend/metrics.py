@@ -0,0 +1,131 @@
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {value}")
+        return "\n".join(lines)
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    labels = _labels_text(self.labelnames, key, ("le", str(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _labels_text(self.labelnames, key, ("le", "+Inf"))
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {series['count']}")
+        return "\n".join(lines)
+
+STAGE_SECONDS = Histogram("documind_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+STAGE_ERRORS = Counter("documind_stage_errors_total", "Pipeline stages that raised.", ["stage"])
+REQUESTS = Counter("documind_http_requests_total", "HTTP requests by route and status code.", ["route", "method", "status"])
+REQUEST_SECONDS = Histogram("documind_http_request_seconds", "HTTP request latency by route.", ["route", "method"])
+CONTEXT_TOKENS = Counter("documind_context_tokens_total", "Estimated prompt context tokens sent (packed) and avoided (saved).", ["kind"])
+METRICS = [STAGE_SECONDS, STAGE_ERRORS, REQUESTS, REQUEST_SECONDS, CONTEXT_TOKENS]
+
+class Timings:
+    """Per-request (or per-job) breakdown of time spent in each stage."""
+
+    def __init__(self):
+        self._seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: round(seconds, 4) for stage, seconds in self._seconds.items()}
+
+    def server_timing(self) -> str:
+        """Value for a Server-Timing response header (durations in milliseconds)."""
+        return ", ".join(f"{stage.replace(' ', '_')};dur={seconds * 1000:.1f}" for stage, seconds in self.to_dict().items())
+
+_current_timings: contextvars.ContextVar[Optional[Timings]] = contextvars.ContextVar("documind_timings", default=None)
+
+@contextmanager
+def track(timings: Timings):
+    """Collect spans in this context (and threads started with a copy of it) into `timings`."""
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+def current_timings() -> Optional[Timings]:
+    return _current_timings.get()
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage into the stage histogram and the current request's breakdown."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
+        logger.debug("%s took %.3fs", stage, elapsed)
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in METRICS) + "\n"
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import logging
+import argparse
+import statistics
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+import config
+
+logger = logging.getLogger(__name__)
+
+FP32_FILENAME = "model.onnx"
+INT8_FILENAME = "model_int8.onnx"
+INFO_FILENAME = "export_info.json"
+# all-MiniLM-L6-v2 is trained and served by sentence-transformers with this limit.
+MAX_SEQ_LENGTH = 256
+
+SAMPLE_TEXTS = [
+    "Non-alcoholic fatty liver disease is the most common chronic liver disease worldwide.",
+    "Liver biopsy remains the reference standard for staging fibrosis.",
+    "Table 2 lists the baseline characteristics of the study population.",
+    "Weight loss of 7-10% improves steatosis, inflammation and fibrosis.",
+    "Figure 3 shows the prevalence of NAFLD by region between 1990 and 2019.",
+    "Elastography measures liver stiffness non-invasively.",
+    "Patients with type 2 diabetes have a higher risk of progression to NASH.",
+    "The FIB-4 index combines age, AST, ALT and platelet count.",
+    "What are the risk factors for hepatocellular carcinoma?",
+    "Summary",
+]
+
+def _hub_name(model_name: str) -> str:
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+def model_dir_for(model_name: str = config.EMBEDDING_MODEL_NAME, root: str = config.ONNX_MODEL_DIR) -> str:
+    return os.path.join(root, _hub_name(model_name).replace("/", "--"))
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformer embeddings computed by an int8-quantized ONNX export of the model.
+
+    Tokenization uses the Rust `tokenizers` fast tokenizer. Texts are sorted by length
+    before batching so each batch pads to a similar length, then mean-pooled and
+    L2-normalized like the sentence-transformers pipeline.
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = config.EMBED_BATCH_SIZE, threads: int = config.EMBED_THREADS,
+                 filename: str = INT8_FILENAME):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        pad_id = self.tokenizer.token_to_id("[PAD]")
+        self.tokenizer.enable_padding(pad_id=pad_id or 0, pad_token="[PAD]")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, filename), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [text.replace("\n", " ") for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._encode_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def export_model(model_name: str, model_dir: str, opset: int = 14) -> str:
+    """Export the Hugging Face model to ONNX, quantize it to int8 and save its fast tokenizer."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    repo = _hub_name(model_name)
+    logger.info(f"Exporting '{repo}' to ONNX in {model_dir}...")
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    tokenizer.save_pretrained(model_dir)
+    model = AutoModel.from_pretrained(repo).eval()
+    inputs = tokenizer(["warm-up"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(model_dir, FP32_FILENAME)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(inputs[name] for name in names), fp32_path,
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+            opset_version=opset, dynamo=False,
+        )
+    int8_path = os.path.join(model_dir, INT8_FILENAME)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    logger.info(f"Quantized model written to {int8_path} ({os.path.getsize(int8_path) / 1e6:.1f} MB, fp32 {os.path.getsize(fp32_path) / 1e6:.1f} MB)")
+    return int8_path
+
+def reference_embeddings(model_name: str = config.EMBEDDING_MODEL_NAME) -> Embeddings:
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": config.EMBED_BATCH_SIZE})
+
+def consistency_check(reference: Embeddings, candidate: Embeddings, texts: List[str] = SAMPLE_TEXTS) -> Dict:
+    """Cosine similarity between reference and candidate vectors for the same texts."""
+    texts = list(dict.fromkeys(texts))
+    ref = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    cand = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    cosines = (ref * cand).sum(axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1))
+    # Top-1 agreement: does each text's nearest neighbour among the others stay the same?
+    ref_n, cand_n = ref / np.linalg.norm(ref, axis=1, keepdims=True), cand / np.linalg.norm(cand, axis=1, keepdims=True)
+    ref_sim, cand_sim = ref_n @ ref_n.T, cand_n @ cand_n.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    return {
+        "texts": len(texts),
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "min_cosine": round(float(cosines.min()), 5),
+        "neighbour_agreement": round(float((ref_sim.argmax(axis=1) == cand_sim.argmax(axis=1)).mean()), 3),
+    }
+
+def load_onnx_embeddings(model_name: str = config.EMBEDDING_MODEL_NAME, min_cosine: float = config.ONNX_MIN_COSINE) -> OnnxEmbeddings:
+    """Load the int8 ONNX embedder, exporting and checking it against PyTorch on first use."""
+    model_dir = model_dir_for(model_name)
+    info_path = os.path.join(model_dir, INFO_FILENAME)
+    if not os.path.exists(os.path.join(model_dir, INT8_FILENAME)) or not os.path.exists(info_path):
+        export_model(model_name, model_dir)
+        embeddings = OnnxEmbeddings(model_dir)
+        info = {"model": _hub_name(model_name), "consistency": consistency_check(reference_embeddings(model_name), embeddings)}
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
+    else:
+        embeddings = OnnxEmbeddings(model_dir)
+        with open(info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    consistency = info["consistency"]
+    logger.info(f"ONNX int8 embedder consistency: mean cosine {consistency['mean_cosine']}, min {consistency['min_cosine']}")
+    if consistency["min_cosine"] < min_cosine:
+        raise RuntimeError(f"ONNX int8 vectors deviate from the reference (min cosine {consistency['min_cosine']} < {min_cosine})")
+    return embeddings
+
+def _time(fn, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def benchmark(embedders: Dict[str, Embeddings], texts: List[str], query_repeat: int = 50) -> Dict[str, Dict]:
+    """Single-query latency and batch throughput for each embedder."""
+    results = {}
+    for name, embedder in embedders.items():
+        embedder.embed_documents(texts[:8])
+        latencies = sorted(_time(lambda: embedder.embed_query(texts[0]), query_repeat))
+        batch_seconds = min(_time(lambda: embedder.embed_documents(texts), 3))
+        results[name] = {
+            "query_p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+            "docs_per_second": round(len(texts) / batch_seconds, 1),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, check and benchmark the ONNX int8 embedder.")
+    parser.add_argument("command", choices=["export", "check", "bench"])
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL_NAME)
+    parser.add_argument("--texts", help="File with one text per line to check and benchmark on (default: built-in samples).")
+    args = parser.parse_args()
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    texts = SAMPLE_TEXTS * 26
+    if args.texts:
+        with open(args.texts, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    model_dir = model_dir_for(args.model)
+    if args.command == "export":
+        export_model(args.model, model_dir)
+        return
+    if not os.path.exists(os.path.join(model_dir, INT8_FILENAME)):
+        export_model(args.model, model_dir)
+    reference = reference_embeddings(args.model)
+    candidates = {"onnx_int8": OnnxEmbeddings(model_dir)}
+    if args.command == "bench":
+        candidates["onnx_fp32"] = OnnxEmbeddings(model_dir, filename=FP32_FILENAME)
+    for name, candidate in candidates.items():
+        print(name, json.dumps(consistency_check(reference, candidate, texts[:256])))
+    if args.command == "bench":
+        results = benchmark({"torch": reference, **candidates}, texts)
+        for name, row in results.items():
+            print(f"{name:>10}: query p50 {row['query_p50_ms']:>7} ms  p95 {row['query_p95_ms']:>7} ms  {row['docs_per_second']:>8} docs/s")
+        base = results["torch"]
+        for name in candidates:
+            print(f"{name} vs torch: {base['query_p50_ms'] / results[name]['query_p50_ms']:.2f}x query latency, "
+                  f"{results[name]['docs_per_second'] / base['docs_per_second']:.2f}x throughput")
+
+if __name__ == "__main__":
+    main()
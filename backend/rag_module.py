@@ -1,133 +1,274 @@
-
 import os
 import sys
 import shutil
+import logging
 import pytesseract
 
-print(f"--- Running rag_module.py ---")
-print(f"Python executable: {sys.executable}")
-print(f"Initial PATH: {os.environ.get('PATH', 'PATH not set')}")
+logger = logging.getLogger(__name__)
+
+logger.debug(f"--- Running rag_module.py ---")
+logger.debug(f"Python executable: {sys.executable}")
+logger.debug(f"Initial PATH: {os.environ.get('PATH', 'PATH not set')}")
 
 TESSERACT_DIR = r'C:\Program Files\Tesseract-OCR'
 TESSDATA_DIR = os.path.join(TESSERACT_DIR, 'tessdata')
 TESSERACT_EXE_PATH = os.path.join(TESSERACT_DIR, 'tesseract.exe')
 
 if not os.path.exists(TESSERACT_EXE_PATH):
-    print(f"FATAL ERROR: Tesseract executable not found at: {TESSERACT_EXE_PATH}")
+    logger.warning(f"Tesseract executable not found at: {TESSERACT_EXE_PATH}")
 else:
-    print(f"Verified Tesseract executable exists at: {TESSERACT_EXE_PATH}")
+    logger.debug(f"Verified Tesseract executable exists at: {TESSERACT_EXE_PATH}")
     pytesseract.pytesseract.tesseract_cmd = TESSERACT_EXE_PATH
-    print(f"Set pytesseract.tesseract_cmd to: {pytesseract.pytesseract.tesseract_cmd}")
+    logger.debug(f"Set pytesseract.tesseract_cmd to: {pytesseract.pytesseract.tesseract_cmd}")
 
     if TESSERACT_DIR not in os.environ.get('PATH', ''):
-        print(f"Adding Tesseract directory to process PATH: {TESSERACT_DIR}")
+        logger.debug(f"Adding Tesseract directory to process PATH: {TESSERACT_DIR}")
         os.environ['PATH'] += os.pathsep + TESSERACT_DIR
-        print(f"Updated PATH: {os.environ.get('PATH')}")
+        logger.debug(f"Updated PATH: {os.environ.get('PATH')}")
     else:
-        print(f"Tesseract directory already in process PATH.")
+        logger.debug(f"Tesseract directory already in process PATH.")
 
     if os.path.isdir(TESSDATA_DIR):
         os.environ['TESSDATA_PREFIX'] = TESSDATA_DIR
-        print(f"Set TESSDATA_PREFIX environment variable to: {os.environ['TESSDATA_PREFIX']}")
+        logger.debug(f"Set TESSDATA_PREFIX environment variable to: {os.environ['TESSDATA_PREFIX']}")
     else:
-        print(f"WARNING: Tesseract tessdata directory not found at: {TESSDATA_DIR}")
+        logger.warning(f"Tesseract tessdata directory not found at: {TESSDATA_DIR}")
 
     tesseract_found_path = shutil.which("tesseract")
     if tesseract_found_path:
-        print(f"Tesseract command found by shutil.which: {tesseract_found_path}")
+        logger.debug(f"Tesseract command found by shutil.which: {tesseract_found_path}")
     else:
-        print("WARNING: Tesseract command still not found by shutil.which after PATH modification.")
-
-print("--- Proceeding with other imports ---")
-from langchain_community.document_loaders import DirectoryLoader
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.chat_models import ChatOllama
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-
-DATA_PATH = "../sample_data"
-CHROMA_PATH = "chroma_db"
-
-PROMPT_TEMPLATE = """
-Answer the question based only on the following context:
-{context}
----
-Answer the question based on the above context: {question}
-"""
-
-def load_documents():
-    print(f"Loading documents from {DATA_PATH}...")
-    loader = DirectoryLoader(DATA_PATH, glob="**/*", show_progress=True, use_multithreading=True)
+        logger.warning("Tesseract command still not found by shutil.which after PATH modification.")
+
+logger.debug("--- Proceeding with other imports ---")
+import hashlib
+from collections import defaultdict
+from manifest import IngestionManifest, MANIFEST_FILENAME, hash_chunk, hash_file, scan_files
+from extraction import extract_files
+import config
+from config import DATA_PATH
+from resources import IndexHandles, vectors_filename
+from index_versions import ConcurrentPublishError
+from figure_index import FIGURE_INDEX_FILENAME
+from workspaces import workspaces
+from embedding_pipeline import EmbeddingPipeline
+from metrics import span
+
+def _report(progress, rel_path, stage, **kwargs):
+    if progress is not None:
+        progress(rel_path, stage, **kwargs)
+
+def load_documents(file_hashes=None, progress=None, figures=None, data_path=DATA_PATH, *, index_dir):
+    """Extract text for {rel_path: content_hash}, or for every file in `data_path`.
+
+    If `figures` is a dict it is filled with {rel_path: [figure/table, ...]} from the same pass;
+    their images are saved inside `index_dir`, the index version being built.
+    """
+    if file_hashes is None:
+        logger.info(f"Loading documents from {data_path}...")
+        file_hashes = {rel_path: hash_file(os.path.join(data_path, rel_path)) for rel_path in scan_files(data_path)}
+    else:
+        logger.info(f"Loading {len(file_hashes)} new or changed document(s) from {data_path}...")
+
+    def on_extracted(rel_path, result):
+        cached = " (cached)" if result["cached"] else ""
+        logger.debug(f"  -> Extracted {rel_path}: {len(result['pages'])} page(s), {result['ocr_pages']} OCR'd{cached}")
+        _report(progress, rel_path, "parsed")
+        if result["ocr_pages"]:
+            _report(progress, rel_path, "ocr")
+
+    from langchain_core.documents import Document
     try:
-        documents = loader.load()
+        files = [(rel_path, os.path.join(data_path, rel_path), file_hash) for rel_path, file_hash in sorted(file_hashes.items())]
+        with span("load"):
+            results = extract_files(files, index_dir, on_done=on_extracted)
+        documents = []
+        for rel_path, full_path, _ in files:
+            if figures is not None:
+                figures[rel_path] = results[rel_path].get("figures", [])
+            for page in results[rel_path]["pages"]:
+                metadata = {"source": full_path}
+                if page["page"] is not None:
+                    metadata["page"] = page["page"]
+                documents.append(Document(page_content=page["text"], metadata=metadata))
         if not documents:
-            print("Warning: No documents found in the specified path.")
+            logger.warning("No documents found in the specified path.")
             return []
-        print(f"Loaded {len(documents)} document(s).")
+        logger.info(f"Loaded {len(documents)} document(s).")
         return documents
     except Exception as e:
-        print(f"Error loading documents: {e}")
+        logger.exception(f"Error loading documents: {e}")
         raise e
 
 def split_documents(documents):
     if not documents:
-        print("No documents to split.")
+        logger.info("No documents to split.")
         return []
-    print("Splitting documents into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(documents)
-    print(f"Split into {len(splits)} chunks.")
+    logger.info("Splitting documents into chunks...")
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+    with span("split"):
+        splits = text_splitter.split_documents(documents)
+    logger.info(f"Split into {len(splits)} chunks.")
     return splits
 
-def save_to_chroma(splits):
-    if not splits:
-        print("No document splits to save to Chroma.")
+def _relative_source(doc, data_path):
+    return os.path.relpath(doc.metadata.get("source", ""), data_path).replace(os.sep, "/")
+
+def assign_chunk_ids(splits, data_path=DATA_PATH):
+    """Give every chunk a stable id derived from its file and content hash.
+
+    Identical chunks keep their id across re-ingestion, so their vectors are reused.
+    Returns {rel_path: [(chunk_id, chunk_hash, split), ...]}.
+    """
+    by_file = defaultdict(list)
+    seen = defaultdict(int)
+    for split in splits:
+        rel_path = _relative_source(split, data_path)
+        chunk_hash = hash_chunk(split.page_content, split.metadata)
+        occurrence = seen[(rel_path, chunk_hash)]
+        seen[(rel_path, chunk_hash)] += 1
+        chunk_id = hashlib.sha256(f"{rel_path}\0{chunk_hash}\0{occurrence}".encode("utf-8")).hexdigest()
+        split.metadata["chunk_id"] = chunk_id
+        by_file[rel_path].append((chunk_id, chunk_hash, split))
+    return by_file
+
+def save_to_chroma(splits, ids=None, stale_ids=None, registry=None):
+    registry = registry or workspaces.get().registry.handles()
+    if not splits and not stale_ids:
+        logger.info("No document changes to save to Chroma.")
         return None
-    print("Creating local embeddings... (This may take a moment)")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    if os.path.exists(CHROMA_PATH):
-        print("Clearing old Chroma database.")
-        shutil.rmtree(CHROMA_PATH)
-    db = Chroma.from_documents(splits, embeddings, persist_directory=CHROMA_PATH)
-    print(f"Saved embeddings to {CHROMA_PATH}.")
-    return db
-
-def process_documents():
+    logger.info("Creating local embeddings... (This may take a moment)")
+    db = registry.get_vectorstore(create=True)
+    bm25 = registry.get_bm25_index()
+    if stale_ids:
+        logger.info(f"Removing {len(stale_ids)} stale chunk(s) from Chroma.")
+        with span("chroma_write"):
+            db.delete(ids=list(stale_ids))
+        bm25.remove(stale_ids)
+    embed_stats = None
+    if splits:
+        texts = [split.page_content for split in splits]
+        metadatas = [split.metadata for split in splits]
+        embed_stats = EmbeddingPipeline(registry.get_embeddings(), cache=registry.get_embedding_cache(), model_name=registry.models.embedding_key).embed_and_store(db, ids, texts, metadatas)
+        logger.info(f"Embedding throughput: {embed_stats['chunks_per_second']} chunks/s")
+        bm25.add(ids, texts)
+    if hasattr(db, "flush"):
+        with span("vector_write"):
+            db.flush()
+    with span("bm25_write"):
+        bm25.save()
+    logger.info(f"Saved {len(splits)} new embedding(s) to {registry.index_path} and updated the BM25 index.")
+    return embed_stats
+
+def update_figure_index(figures, removed, registry):
+    """Replace the indexed figures/tables of re-extracted files and drop those of deleted files."""
+    figure_index = registry.get_figure_index()
+    with span("figure_index"):
+        for rel_path in removed:
+            figure_index.remove_file(rel_path)
+        embed_fn = registry.get_embeddings().embed_documents
+        for rel_path, file_figures in figures.items():
+            figure_index.add_file(rel_path, file_figures, embed_fn)
+        figure_index.save()
+    logger.info(f"Figure index updated: {sum(len(f) for f in figures.values())} figure(s)/table(s) from {len(figures)} file(s), {len(figure_index)} total.")
+
+def process_documents(progress=None, workspace=None):
+    """Bring a workspace's index (the default one if not given) in line with its data directory.
+
+    Changes go into a copy of the current index version, which is published atomically
+    once complete; chats keep reading the previous version until then. Planning through
+    publishing holds the index root's writer lock, so Uvicorn workers ingesting into the
+    same workspace take turns instead of overwriting each other's version.
+    """
+    workspace = workspace or workspaces.get()
     try:
-        documents = load_documents()
-        splits = split_documents(documents)
-        save_to_chroma(splits)
-        print("Document processing complete.")
+        while True:
+            try:
+                with workspace.registry.versions.writer_lock():
+                    return _ingest(workspace, progress)
+            except ConcurrentPublishError as e:
+                logger.warning(f"{e} Planning the ingestion again from the new version.")
     except Exception as e:
-        print(f"An error occurred during document processing: {e}")
+        logger.exception(f"An error occurred during document processing: {e}")
         raise e
 
-def get_rag_chain():
-    print("Setting up RAG chain...")
-    if not os.path.exists(CHROMA_PATH):
-        print(f"Error: Chroma database not found at {CHROMA_PATH}. Please upload documents first.")
-        raise FileNotFoundError(f"Chroma database not found at {CHROMA_PATH}")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vectorstore = Chroma(persist_directory=CHROMA_PATH, embedding_function=embeddings)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
-    llm = ChatOllama(model="llama3:8b")
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    rag_chain = (
-        {"context": retriever, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
-    print("RAG chain is ready.")
+def _ingest(workspace, progress):
+    live, data_path = workspace.registry, workspace.data_path
+    versions = live.versions
+    base = published = versions.current()
+    base_path = versions.path(base) if base else None
+    if base_path and not os.path.exists(os.path.join(base_path, MANIFEST_FILENAME)):
+        logger.info("Chroma database has no ingestion manifest. Rebuilding it once from scratch.")
+        base = base_path = None
+    elif base_path and not os.path.exists(os.path.join(base_path, vectors_filename())):
+        logger.info(f"Index has no '{config.VECTOR_BACKEND}' vectors yet. Rebuilding it from scratch (cached embeddings are reused).")
+        base = base_path = None
+    manifest = IngestionManifest(os.path.join(base_path, MANIFEST_FILENAME) if base_path else "")
+    to_ingest, unchanged, removed = manifest.plan(data_path)
+    logger.info(f"Ingestion plan: {len(to_ingest)} new/changed, {len(unchanged)} unchanged, {len(removed)} removed file(s).")
+    backfill = []
+    if unchanged and not os.path.exists(os.path.join(base_path, FIGURE_INDEX_FILENAME)):
+        backfill = [(rel_path, os.path.join(data_path, rel_path), info["hash"]) for rel_path, info in unchanged.items()]
+    if not to_ingest and not removed and not backfill:
+        # The published version is read-only, so refreshed sizes/mtimes of touched files are
+        # not saved here; they are recorded with the next version that changes the index.
+        logger.info("Index is already up to date.")
+        return
+
+    with versions.stage(base) as staging_path:
+        registry = IndexHandles(staging_path, live.models, os.path.basename(staging_path))
+        manifest.path = os.path.join(staging_path, MANIFEST_FILENAME)
+        figures = {}
+        if backfill:
+            logger.info("Figure index missing. Extracting figures and tables from the already indexed files...")
+            figures.update({rel_path: result.get("figures", []) for rel_path, result in extract_files(backfill, staging_path).items()})
+        documents = load_documents({rel_path: info["hash"] for rel_path, info in to_ingest.items()}, progress=progress, figures=figures, data_path=data_path, index_dir=staging_path) if to_ingest else []
+        splits = split_documents(documents)
+        chunks_by_file = assign_chunk_ids(splits, data_path)
+        for rel_path in to_ingest:
+            _report(progress, rel_path, "chunked")
+
+        new_splits, new_ids, stale_ids = [], [], []
+        new_chunk_counts = {}
+        for rel_path in removed:
+            stale_ids.extend(manifest.remove_file(rel_path))
+        for rel_path, info in to_ingest.items():
+            old_chunks = manifest.chunk_hashes(rel_path)
+            file_chunks = {}
+            new_chunk_counts[rel_path] = 0
+            for chunk_id, chunk_hash, split in chunks_by_file.get(rel_path, []):
+                file_chunks[chunk_id] = chunk_hash
+                if chunk_id not in old_chunks:
+                    new_splits.append(split)
+                    new_ids.append(chunk_id)
+                    new_chunk_counts[rel_path] += 1
+            stale_ids.extend(chunk_id for chunk_id in old_chunks if chunk_id not in file_chunks)
+            manifest.record_file(rel_path, info, file_chunks)
+
+        embed_stats = save_to_chroma(new_splits, ids=new_ids, stale_ids=stale_ids, registry=registry)
+        update_figure_index(figures, removed, registry)
+        manifest.version += 1
+        manifest.save()
+        registry.reset_index()
+        versions.publish(staging_path, published)
+    for rel_path, count in new_chunk_counts.items():
+        _report(progress, rel_path, "embedded", chunks=count)
+    workspaces.refresh(workspace)
+    logger.info(f"Document processing complete for workspace '{workspace.id}'. Index version {manifest.version}.")
+    return embed_stats
+
+def get_rag_chain(workspace=None):
+    logger.debug("Setting up RAG chain...")
+    registry = (workspace or workspaces.get()).registry
+    if not registry.has_index():
+        logger.error(f"Chroma database not found at {registry.chroma_path}. Please upload documents first.")
+        raise FileNotFoundError(f"Chroma database not found at {registry.chroma_path}")
+    rag_chain = registry.get_rag_chain()
+    logger.debug("RAG chain is ready.")
     return rag_chain
 
 if __name__ != "__main__":
     if not shutil.which("tesseract"):
-        print("\n*********************************************************************")
-        print("WARNING: Tesseract command not found by system PATH check on import.")
-        print("The application might fail if OCR is needed for document processing.")
-        print("*********************************************************************\n")
+        logger.warning("Tesseract command not found by system PATH check on import. The application might fail if OCR is needed for document processing.")
 
@@ -1,47 +1,125 @@
-
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak, KeepTogether
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
+import io
 import os
-from typing import List, Dict, Any
+import logging
+import hashlib
+from typing import List, Dict, Any, BinaryIO, Tuple, Union
 import time
+import config
+from lru import LRUCache
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_WIDTH = 6.5 * inch
+MAX_IMAGE_HEIGHT = 8.0 * inch
 
-def create_report_pdf(report_data: Dict[str, List[Dict[str, Any]]], output_filename: str) -> str | None:
-    print(f"--- 📄 Starting PDF Generation: {output_filename} ---")
-    doc = SimpleDocTemplate(output_filename, pagesize=(8.5*inch, 11*inch),
+def _build_styles():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='TitleStyle', parent=styles['h1'], alignment=TA_CENTER, spaceAfter=20, fontSize=18, textColor=colors.darkblue))
+    styles.add(ParagraphStyle(name='HeadingStyle', parent=styles['h2'], spaceBefore=14, spaceAfter=8, keepWithNext=1, fontSize=14, textColor=colors.darkslategray))
+    styles.add(ParagraphStyle(name='BodyStyle', parent=styles['Normal'], alignment=TA_JUSTIFY, spaceAfter=10, leading=15, fontSize=11))
+    styles.add(ParagraphStyle(name='CaptionStyle', parent=styles['Italic'], alignment=TA_CENTER, fontSize=9, spaceBefore=4, spaceAfter=12, textColor=colors.dimgray))
+    styles.add(ParagraphStyle(name='ErrorStyle', parent=styles['Italic'], alignment=TA_LEFT, textColor=colors.red, spaceAfter=8, fontSize=10))
+    return styles
+
+# Built once; ReportLab styles are read-only during rendering, so concurrent report jobs can share them.
+STYLES = _build_styles()
+TABLE_TEXT_STYLE = ParagraphStyle(name='TableTextStyle', parent=STYLES['Normal'], alignment=TA_LEFT, fontSize=8, leading=10)
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0,0), (-1,0), colors.darkslategray),
+    ('TEXTCOLOR',(0,0),(-1,0),colors.whitesmoke),
+    ('ALIGN', (0,0), (-1,0), 'CENTER'),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0,0), (-1,0), 10),
+    ('TOPPADDING', (0,0), (-1,0), 6),
+    ('BACKGROUND', (0,1), (-1,-1), colors.lavenderblush),
+    ('TEXTCOLOR',(0,1),(-1,-1),colors.black),
+    ('ALIGN', (0,1), (-1,-1), 'LEFT'),
+    ('TOPPADDING', (0,1), (-1,-1), 4),
+    ('BOTTOMPADDING', (0,1), (-1,-1), 4),
+    ('GRID', (0,0), (-1,-1), 1, colors.darkgrey),
+    ('BOX', (0,0), (-1,-1), 1.5, colors.black),
+    ('INNERGRID', (0,0), (-1,-1), 0.5, colors.grey),
+])
+
+_image_cache = LRUCache(config.REPORT_IMAGE_CACHE_ENTRIES)
+
+def prepare_image(img_path: str, dpi: int = config.REPORT_IMAGE_DPI) -> Tuple[bytes, float, float]:
+    """Downsample and recompress an image for its size on the page.
+
+    Returns (encoded bytes, draw width, draw height) in points. Results are cached
+    by the hash of the file content, so a figure reused across reports is only
+    resampled once.
+    """
+    from PIL import Image as PILImage
+    with open(img_path, "rb") as f:
+        raw = f.read()
+    key = (hashlib.sha256(raw).hexdigest(), dpi, config.REPORT_IMAGE_JPEG_QUALITY)
+    cached = _image_cache.get(key)
+    if cached is not None:
+        return cached
+    with PILImage.open(io.BytesIO(raw)) as image:
+        image.load()
+        width_px, height_px = image.size
+        # Natural size at 72 points per inch, as platypus.Image would draw it, scaled down to fit the frame.
+        scale = min(1.0, MAX_IMAGE_WIDTH / width_px, MAX_IMAGE_HEIGHT / height_px)
+        draw_width, draw_height = width_px * scale, height_px * scale
+        target = (max(1, round(draw_width / 72 * dpi)), max(1, round(draw_height / 72 * dpi)))
+        if target[0] < width_px:
+            image = image.resize(target, PILImage.LANCZOS)
+        out = io.BytesIO()
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha or image.mode in ("P", "1"):
+            image.save(out, "PNG", optimize=True)
+        else:
+            image.convert("RGB" if image.mode != "L" else "L").save(out, "JPEG", quality=config.REPORT_IMAGE_JPEG_QUALITY, optimize=True)
+    result = (out.getvalue(), draw_width, draw_height)
+    _image_cache.put(key, result)
+    return result
+
+def render_report_pdf(report_data: Dict[str, List[Dict[str, Any]]]) -> bytes | None:
+    """Render the report into memory and return the PDF bytes."""
+    buffer = io.BytesIO()
+    if create_report_pdf(report_data, buffer) is None:
+        return None
+    return buffer.getvalue()
+
+def create_report_pdf(report_data: Dict[str, List[Dict[str, Any]]], output: Union[str, BinaryIO]) -> Union[str, BinaryIO, None]:
+    """Render the report to a file path or a writable binary stream and return it."""
+    output_filename = output if isinstance(output, str) else "<memory>"
+    logger.info(f"--- 📄 Starting PDF Generation: {output_filename} ---")
+    started = time.perf_counter()
+    doc = SimpleDocTemplate(output, pagesize=(8.5*inch, 11*inch),
                             leftMargin=0.75*inch, rightMargin=0.75*inch,
                             topMargin=0.75*inch, bottomMargin=0.75*inch)
-    styles = getSampleStyleSheet()
+    styles = STYLES
     story = []
 
     if not report_data or not isinstance(report_data, dict):
-        print("❌ Error: Invalid or empty report_data provided for PDF generation.")
+        logger.error("❌ Error: Invalid or empty report_data provided for PDF generation.")
         story = [Paragraph("Error: Report Generation Failed", styles['h1']),
                  Paragraph("Invalid or no data received from the generation process. Check agent logs.", styles['Normal'])]
         try:
             doc.build(story)
-            print(f"Generated error PDF: {output_filename}")
-            return output_filename
+            logger.warning(f"Generated error PDF: {output_filename}")
+            return output
         except Exception as e:
-            print(f"CRITICAL: Error building the error PDF: {e}")
+            logger.error(f"CRITICAL: Error building the error PDF: {e}")
             return None
 
-    styles.add(ParagraphStyle(name='TitleStyle', parent=styles['h1'], alignment=TA_CENTER, spaceAfter=20, fontSize=18, textColor=colors.darkblue))
-    styles.add(ParagraphStyle(name='HeadingStyle', parent=styles['h2'], spaceBefore=14, spaceAfter=8, keepWithNext=1, fontSize=14, textColor=colors.darkslategray))
-    styles.add(ParagraphStyle(name='BodyStyle', parent=styles['Normal'], alignment=TA_JUSTIFY, spaceAfter=10, leading=15, fontSize=11))
-    styles.add(ParagraphStyle(name='CaptionStyle', parent=styles['Italic'], alignment=TA_CENTER, fontSize=9, spaceBefore=4, spaceAfter=12, textColor=colors.dimgray))
-    styles.add(ParagraphStyle(name='ErrorStyle', parent=styles['Italic'], alignment=TA_LEFT, textColor=colors.red, spaceAfter=8, fontSize=10))
-    table_text_style = ParagraphStyle(name='TableTextStyle', parent=styles['Normal'], alignment=TA_LEFT, fontSize=8, leading=10)
-
     story.append(Paragraph("Generated Medical Report: NAFLD Analysis", styles['TitleStyle']))
 
     section_keys = list(report_data.keys())
     for i, section_title in enumerate(section_keys):
         content_blocks = report_data.get(section_title, [])
         clean_section_title = section_title.replace('_', ' ').title()
-        print(f"📄 Adding PDF Section: '{clean_section_title}'")
+        logger.debug(f"📄 Adding PDF Section: '{clean_section_title}'")
         story.append(Paragraph(clean_section_title, styles['HeadingStyle']))
 
         if not content_blocks or not isinstance(content_blocks, list):
@@ -55,7 +133,7 @@ def create_report_pdf(report_data: Dict[str, List[Dict[str, Any]]], output_filen
                 continue
 
             block_type = block.get("type", "text")
-            print(f"  -> Rendering block {block_num+1}: {block_type}")
+            logger.debug(f"  -> Rendering block {block_num+1}: {block_type}")
 
             try:
                 if block_type == "text":
@@ -67,16 +145,8 @@ def create_report_pdf(report_data: Dict[str, List[Dict[str, Any]]], output_filen
                     caption = block.get("caption", os.path.basename(img_path) if img_path else "Image")
                     if img_path and os.path.exists(img_path):
                         try:
-                            img = Image(img_path)
-                            max_width = 6.5 * inch
-                            max_height = 8.0 * inch
-                            img_width, img_height = img.drawWidth, img.drawHeight
-                            width_ratio = max_width / img_width if img_width > max_width else 1
-                            height_ratio = max_height / img_height if img_height > max_height else 1
-                            scale_ratio = min(width_ratio, height_ratio)
-                            if scale_ratio < 1:
-                                img.drawWidth = img_width * scale_ratio
-                                img.drawHeight = img_height * scale_ratio
+                            img_bytes, draw_width, draw_height = prepare_image(img_path)
+                            img = Image(io.BytesIO(img_bytes), width=draw_width, height=draw_height)
                             img.hAlign = 'CENTER'
                             img_container = KeepTogether([
                                 Spacer(1, 0.1*inch), img, Spacer(1, 0.05*inch),
@@ -84,37 +154,21 @@ def create_report_pdf(report_data: Dict[str, List[Dict[str, Any]]], output_filen
                             ])
                             story.append(img_container)
                         except Exception as img_err:
-                            print(f"    ⚠️ Error loading/processing image {img_path}: {img_err}")
+                            logger.warning(f"    ⚠️ Error loading/processing image {img_path}: {img_err}")
                             story.append(Paragraph(f"[Error rendering image: {caption} - {img_err}]", styles['ErrorStyle']))
                     else:
-                        print(f"    ⚠️ Warning: Image path not found or invalid: {img_path}")
+                        logger.warning(f"    ⚠️ Warning: Image path not found or invalid: {img_path}")
                         story.append(Paragraph(f"[Image not found: {caption}]", styles['ErrorStyle']))
 
                 elif block_type == "table":
                     table_data = block.get("data")
                     caption = block.get("caption", "Table")
                     if isinstance(table_data, list) and len(table_data) > 0 and all(isinstance(r, list) for r in table_data) and len(table_data[0]) > 0:
-                        styled_table_data = [[Paragraph(str(cell), table_text_style) for cell in row] for row in table_data]
+                        styled_table_data = [[Paragraph(str(cell), TABLE_TEXT_STYLE) for cell in row] for row in table_data]
                         num_cols = len(styled_table_data[0])
                         col_widths = [doc.width/num_cols] * num_cols
                         table = Table(styled_table_data, colWidths=col_widths, hAlign='CENTER', repeatRows=1)
-                        table.setStyle(TableStyle([
-                            ('BACKGROUND', (0,0), (-1,0), colors.darkslategray),
-                            ('TEXTCOLOR',(0,0),(-1,0),colors.whitesmoke),
-                            ('ALIGN', (0,0), (-1,0), 'CENTER'),
-                            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-                            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                            ('BOTTOMPADDING', (0,0), (-1,0), 10),
-                            ('TOPPADDING', (0,0), (-1,0), 6),
-                            ('BACKGROUND', (0,1), (-1,-1), colors.lavenderblush),
-                            ('TEXTCOLOR',(0,1),(-1,-1),colors.black),
-                            ('ALIGN', (0,1), (-1,-1), 'LEFT'),
-                            ('TOPPADDING', (0,1), (-1,-1), 4),
-                            ('BOTTOMPADDING', (0,1), (-1,-1), 4),
-                            ('GRID', (0,0), (-1,-1), 1, colors.darkgrey),
-                            ('BOX', (0,0), (-1,-1), 1.5, colors.black),
-                            ('INNERGRID', (0,0), (-1,-1), 0.5, colors.grey),
-                        ]))
+                        table.setStyle(TABLE_STYLE)
                         table_container = KeepTogether([
                             Spacer(1, 0.1*inch),
                             Paragraph(f"Table: {caption}", styles['CaptionStyle']),
@@ -122,35 +176,38 @@ def create_report_pdf(report_data: Dict[str, List[Dict[str, Any]]], output_filen
                         ])
                         story.append(table_container)
                     else:
-                        print(f"    ⚠️ Warning: Invalid or empty table data for '{caption}'")
+                        logger.warning(f"    ⚠️ Warning: Invalid or empty table data for '{caption}'")
                         story.append(Paragraph(f"[Invalid or empty table data: {caption}]", styles['ErrorStyle']))
                 else:
-                    print(f"    ⚠️ Warning: Unknown block type '{block_type}' found.")
+                    logger.warning(f"    ⚠️ Warning: Unknown block type '{block_type}' found.")
                     story.append(Paragraph(f"[Unsupported content type: {block_type}]", styles['ErrorStyle']))
 
                 story.append(Spacer(1, 0.1*inch))
 
             except Exception as block_error:
-                print(f"  ❌ Error rendering block ({block_type}) in section '{section_title}': {block_error}")
+                logger.error(f"  ❌ Error rendering block ({block_type}) in section '{section_title}': {block_error}")
                 story.append(Paragraph(f"[Error rendering content block - Check logs]", styles['ErrorStyle']))
 
         if i < len(section_keys) - 1:
             story.append(Spacer(1, 0.3*inch))
 
     try:
-        doc.build(story)
-        print(f"--- ✅ Successfully generated PDF: {output_filename} ---")
-        return output_filename
+        with span("pdf_build"):
+            doc.build(story)
+        logger.info(f"--- ✅ Successfully generated PDF: {output_filename} in {time.perf_counter() - started:.2f}s ---")
+        return output
     except Exception as e:
-        print(f"--- ❌ Error building final PDF document: {e} ---")
+        logger.error(f"--- ❌ Error building final PDF document: {e} ---")
         try:
-            doc_err = SimpleDocTemplate(output_filename)
+            if not isinstance(output, str):
+                output.seek(0)
+                output.truncate()
+            doc_err = SimpleDocTemplate(output)
             story_err = [Paragraph("Fatal Error Building Report PDF", styles['h1']),
                          Paragraph(f"An error occurred during final PDF generation: {e}", styles['Normal']),
                          Paragraph("Please check server logs.", styles['Normal'])]
             doc_err.build(story_err)
-            return output_filename
+            return output
         except:
-            print(f"!!! CRITICAL: Failed even to build the error PDF !!!")
+            logger.critical("Failed even to build the error PDF.")
             return None
-        
@@ -0,0 +1,63 @@
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Union
+
+@dataclass
+class TextBlock:
+    content: str
+    type: str = "text"
+
+@dataclass
+class ImageBlock:
+    path: str
+    caption: str = "Image"
+    type: str = "image"
+
+@dataclass
+class TableBlock:
+    data: List[List[str]]
+    caption: str = "Table"
+    type: str = "table"
+
+Block = Union[TextBlock, ImageBlock, TableBlock]
+
+@dataclass
+class Section:
+    title: str
+    blocks: List[Block] = field(default_factory=list)
+
+@dataclass
+class Report:
+    """Ordered sections of text/image/table blocks, filled in code from tool outputs."""
+
+    sections: List[Section] = field(default_factory=list)
+
+    def section(self, title: str) -> Section:
+        for section in self.sections:
+            if section.title == title:
+                return section
+        section = Section(title)
+        self.sections.append(section)
+        return section
+
+    def add_tool_result(self, title: str, tool_name: str, result: Any):
+        self.section(title).blocks.extend(blocks_from_tool_result(tool_name, result, title))
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """The {section title: [block dict, ...]} shape report_generator renders."""
+        return {section.title: [asdict(block) for block in section.blocks] for section in self.sections}
+
+def block_from_dict(block: Dict[str, Any]) -> Block:
+    block_type = block.get("type", "text")
+    if block_type == "image" and block.get("path"):
+        return ImageBlock(path=str(block["path"]), caption=str(block.get("caption") or "Image"))
+    if block_type == "table" and isinstance(block.get("data"), list):
+        rows = [[str(cell) for cell in row] for row in block["data"] if isinstance(row, list)]
+        return TableBlock(data=rows, caption=str(block.get("caption") or "Table"))
+    return TextBlock(content=str(block.get("content", block)))
+
+def blocks_from_tool_result(tool_name: str, result: Any, section_title: str) -> List[Block]:
+    if tool_name in ("extract_exact_text", "generate_summary"):
+        return [TextBlock(content=str(result))]
+    if isinstance(result, list):
+        return [block_from_dict(item) if isinstance(item, dict) else TextBlock(content=str(item)) for item in result]
+    return [TextBlock(content=f"Figure/Table tool ({section_title}) returned unexpected data: {result}")]
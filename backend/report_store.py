@@ -0,0 +1,115 @@
+import logging
+import os
+import time
+import uuid
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+class ReportStore:
+    """Content-addressed PDF store under REPORTS_DIR.
+
+    A report is keyed by the normalized request text, the published index version
+    directory and the settings that change its content, so an identical request
+    against an unchanged index is served from disk. Files older than
+    `max_age_seconds` are dropped, then the least recently used ones until the
+    directory fits in `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age_seconds: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(request: str, workspace: str, index_name: Any) -> str:
+        normalized = " ".join(request.lower().split())
+        # The version directory is unique per publish; the manifest counter restarts on a rebuild.
+        raw = f"{normalized}\0{workspace}\0{index_name}\0{config.REPORT_MODE}\0{config.LLM_MODEL_NAME}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"report_{key}.pdf")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        with self._lock:
+            try:
+                if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                    os.remove(path)
+                    raise FileNotFoundError(path)
+                os.utime(path)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return path
+
+    def temp_path(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f".render_{uuid.uuid4().hex}.pdf.tmp")
+
+    def commit(self, key: str, temp_path: str) -> str:
+        """Move a finished render into place under its key and enforce the limits."""
+        path = self.path_for(key)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        temp_path = self.temp_path()
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        return self.commit(key, temp_path)
+
+    def evict(self):
+        with self._lock:
+            now = time.time()
+            files = []
+            for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # Unfinished renders get a generous grace period before they count as abandoned.
+                if name.endswith(".tmp"):
+                    if now - stat.st_mtime > max(self.max_age_seconds, 3600):
+                        os.remove(path)
+                    continue
+                if name.endswith(".pdf"):
+                    files.append((stat.st_mtime, stat.st_size, path))
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            for mtime, size, path in files:
+                if now - mtime <= self.max_age_seconds and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            if removed:
+                logger.info(f"Report store: evicted {removed} report(s), {total / (1024 * 1024):.1f} MB kept.")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                    "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                    "max_age_hours": round(self.max_age_seconds / 3600, 2)}
+
+report_store = ReportStore(
+    config.REPORTS_DIR,
+    max_bytes=int(config.REPORT_STORE_MAX_MB * 1024 * 1024),
+    max_age_seconds=config.REPORT_STORE_MAX_AGE_HOURS * 3600,
+)
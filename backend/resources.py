@@ -0,0 +1,453 @@
+import logging
+import os
+import time
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+import config
+from manifest import IngestionManifest, MANIFEST_FILENAME
+from bm25_index import BM25Index, BM25_FILENAME
+from lru import RetrievalMemo
+from embedding_pipeline import configure_threads
+from embedding_cache import EmbeddingCache
+from figure_index import FigureIndex
+from index_versions import IndexVersions, LEGACY_MARKER
+from context_builder import build_context
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = """
+Answer the question based only on the following context:
+{context}
+---
+Answer the question based on the above context: {question}
+"""
+
+class IndexBackendError(RuntimeError):
+    """The published index was built for a different VECTOR_BACKEND and has to be rebuilt."""
+
+def vectors_filename() -> str:
+    """File every index version built for the configured VECTOR_BACKEND contains."""
+    if config.VECTOR_BACKEND == "mmap":
+        from vector_store import VECTORS_FILENAME
+        return VECTORS_FILENAME
+    return LEGACY_MARKER
+
+class _Timed:
+    @contextmanager
+    def timed(self, component: str):
+        started = time.perf_counter()
+        yield
+        self.load_times[component] = round(time.perf_counter() - started, 3)
+        logger.info(f"Loaded {component} in {self.load_times[component]:.2f}s")
+
+class ModelRegistry(_Timed):
+    """Process-wide owner of the embedder, LLM clients and prompt chains shared by every workspace.
+
+    Everything, including the LangChain imports, is created on first use and reused
+    afterwards; `load_times` records how long each component took.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._embeddings = None
+        self.embedding_backend = None
+        self._embedding_cache = None
+        self._llms = {}
+        self._prompt = None
+        self._generation_chain = None
+        self._answer_chain = None
+        self.load_times = {}
+
+    def get_embeddings(self):
+        with self._lock:
+            if self._embeddings is None:
+                logger.info(f"Loading embedding model '{config.EMBEDDING_MODEL_NAME}'...")
+                with self.timed("embeddings"):
+                    from retrieval import CachedQueryEmbeddings
+                    base = None
+                    if config.EMBEDDING_BACKEND == "onnx":
+                        try:
+                            from onnx_embeddings import load_onnx_embeddings
+                            base = load_onnx_embeddings()
+                            self.embedding_backend = "onnx-int8"
+                        except Exception as e:
+                            logger.warning(f"ONNX embedder unavailable ({e}). Falling back to PyTorch.")
+                    if base is None:
+                        from langchain_community.embeddings import HuggingFaceEmbeddings
+                        configure_threads()
+                        base = HuggingFaceEmbeddings(
+                            model_name=config.EMBEDDING_MODEL_NAME,
+                            encode_kwargs={"batch_size": config.EMBED_BATCH_SIZE},
+                        )
+                        self.embedding_backend = "torch"
+                    self._embeddings = CachedQueryEmbeddings(base, config.QUERY_EMBEDDING_CACHE_MAX_ENTRIES)
+            return self._embeddings
+
+    @property
+    def embedding_key(self) -> str:
+        """Model identity for the embedding cache; vectors from different runtimes are kept apart."""
+        self.get_embeddings()
+        if self.embedding_backend == "torch":
+            return config.EMBEDDING_MODEL_NAME
+        return f"{config.EMBEDDING_MODEL_NAME}@{self.embedding_backend}"
+
+    def get_embedding_cache(self):
+        with self._lock:
+            if self._embedding_cache is None:
+                self._embedding_cache = EmbeddingCache(config.EMBEDDING_CACHE_PATH, int(config.EMBEDDING_CACHE_MAX_MB * 1024 * 1024))
+            return self._embedding_cache
+
+    def get_llm(self, **kwargs):
+        key = tuple(sorted(kwargs.items()))
+        with self._lock:
+            if key not in self._llms:
+                logger.info(f"Creating Ollama client for '{config.LLM_MODEL_NAME}' {kwargs or ''}")
+                from langchain_community.chat_models import ChatOllama
+                self._llms[key] = ChatOllama(model=config.LLM_MODEL_NAME, **kwargs)
+            return self._llms[key]
+
+    def get_prompt(self):
+        with self._lock:
+            if self._prompt is None:
+                from langchain_core.prompts import ChatPromptTemplate
+                self._prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+            return self._prompt
+
+    def get_generation_chain(self):
+        """llm | parser, taking an already formatted prompt."""
+        with self._lock:
+            if self._generation_chain is None:
+                from langchain_core.output_parsers import StrOutputParser
+                self._generation_chain = self.get_llm() | StrOutputParser()
+            return self._generation_chain
+
+    def get_answer_chain(self):
+        """prompt | llm | parser, for callers that retrieve the context themselves."""
+        with self._lock:
+            if self._answer_chain is None:
+                self._answer_chain = self.get_prompt() | self.get_generation_chain()
+            return self._answer_chain
+
+    def cache_stats(self):
+        if self._embeddings is None:
+            return {}
+        return {"embedding_backend": self.embedding_backend, "query_embeddings": self._embeddings.cache.stats()}
+
+    def warm_up(self):
+        """Load the embedder and make the LLM server load its model."""
+        self.get_embeddings().embed_query("warm-up")
+        with self.timed("llm"):
+            self.get_llm(num_predict=1).invoke("Reply with OK.")
+
+# chromadb keeps one System per persist directory in a class-level cache for the life of the
+# process, whether or not the client is still referenced; count the open stores per directory.
+_chroma_users = Counter()
+_chroma_lock = threading.Lock()
+
+def _open_chroma(path: str, embeddings):
+    from langchain_community.vectorstores import Chroma
+    with _chroma_lock:
+        store = Chroma(persist_directory=path, embedding_function=embeddings)
+        _chroma_users[path] += 1
+    return store
+
+def _close_chroma(path: str, store):
+    """Release a Chroma store; the directory's last one stops its System and evicts it from chromadb's cache."""
+    with _chroma_lock:
+        _chroma_users[path] -= 1
+        if _chroma_users[path] > 0:
+            return
+        del _chroma_users[path]
+        try:
+            from chromadb.api.shared_system_client import SharedSystemClient
+            system = SharedSystemClient._identifier_to_system.pop(store._client._identifier, None)
+        except (ImportError, AttributeError) as e:
+            logger.warning(f"Could not release the Chroma client for {path}: {e}")
+            return
+    if system is not None:
+        system.stop()
+        logger.debug(f"Stopped the Chroma client for {path}.")
+
+class IndexHandles(_Timed):
+    """Handles for one index directory: its vector store, BM25 and figure indexes, retrievers and RAG chain.
+
+    Handles are created on first use; models come from the shared ModelRegistry.
+    Ingestion uses one directly on the version it is building; requests get one
+    for a published version from `ResourceRegistry.lease()`.
+    """
+
+    def __init__(self, index_path: Optional[str], models: ModelRegistry, version: Optional[str] = None):
+        self.index_path = index_path
+        self.models = models
+        self.version = version
+        # Maintained by the owning ResourceRegistry under its lock.
+        self.leases = 0
+        self.retired = False
+        self._lock = threading.RLock()
+        self._vectorstore = None
+        self._bm25 = None
+        self._figure_index = None
+        self._retrievers = {}
+        self._rag_chain = None
+        self._index_version = None
+        self.retrieval_memo = RetrievalMemo(config.RETRIEVAL_MEMO_MAX_ENTRIES)
+        self.load_times = {}
+
+    def get_embeddings(self):
+        return self.models.get_embeddings()
+
+    def get_embedding_cache(self):
+        return self.models.get_embedding_cache()
+
+    def get_answer_chain(self):
+        return self.models.get_answer_chain()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.index_path, MANIFEST_FILENAME)
+
+    @property
+    def bm25_path(self) -> str:
+        return os.path.join(self.index_path, BM25_FILENAME)
+
+    def has_index(self) -> bool:
+        return self.index_path is not None and os.path.exists(self.index_path)
+
+    def _require_index(self):
+        if self.index_path is None:
+            raise FileNotFoundError("No index has been published yet.")
+
+    def backend_error(self) -> Optional[str]:
+        """Why the published index can't be served by the configured VECTOR_BACKEND, or None if it can."""
+        if not self.has_index() or os.path.exists(os.path.join(self.index_path, vectors_filename())):
+            return None
+        return (f"Index version '{self.version}' has no '{config.VECTOR_BACKEND}' vectors (it was built with another "
+                f"VECTOR_BACKEND). It is rebuilt from its data directory by the next ingestion.")
+
+    @property
+    def index_version(self):
+        """Version recorded in the ingestion manifest; bumps on every index change."""
+        with self._lock:
+            if not self.has_index():
+                return None
+            try:
+                mtime = os.path.getmtime(self.manifest_path)
+            except FileNotFoundError:
+                return None
+            # Re-read when the manifest changed, even if another handle set for this directory wrote it.
+            if self._index_version is None or self._index_version[0] != mtime:
+                self._index_version = (mtime, IngestionManifest(self.manifest_path).version)
+            return self._index_version[1]
+
+    def get_vectorstore(self, create: bool = False):
+        with self._lock:
+            if self._vectorstore is None:
+                if not create and not self.has_index():
+                    raise FileNotFoundError(f"Chroma database not found at {self.index_path}")
+                if not create and self.backend_error():
+                    raise IndexBackendError(self.backend_error())
+                embeddings = self.get_embeddings()
+                with self.timed("vectorstore"):
+                    if config.VECTOR_BACKEND == "mmap":
+                        from vector_store import MmapVectorStore
+                        self._vectorstore = MmapVectorStore(self.index_path, embeddings)
+                    else:
+                        self._vectorstore = _open_chroma(self.index_path, embeddings)
+            return self._vectorstore
+
+    def get_bm25_index(self):
+        with self._lock:
+            self._require_index()
+            if self._bm25 is None:
+                with self.timed("bm25"):
+                    bm25 = BM25Index(self.bm25_path)
+                    if not os.path.exists(self.bm25_path) and self.has_index():
+                        logger.info("BM25 index missing. Building it from the Chroma collection...")
+                        data = self.get_vectorstore().get(include=["documents"])
+                        bm25.add(data["ids"], data["documents"])
+                        bm25.save()
+                self._bm25 = bm25
+            return self._bm25
+
+    def get_figure_index(self):
+        with self._lock:
+            self._require_index()
+            if self._figure_index is None:
+                with self.timed("figure_index"):
+                    self._figure_index = FigureIndex(self.index_path)
+            return self._figure_index
+
+    def get_retriever(self, k: int = config.RETRIEVER_K):
+        """Hybrid (or dense-only) retriever returning `k` documents, memoized per index version."""
+        with self._lock:
+            if k not in self._retrievers:
+                from retrieval import HybridRetriever, MemoizedRetriever
+                if config.HYBRID_RETRIEVAL:
+                    retriever = HybridRetriever(
+                        vectorstore=self.get_vectorstore(),
+                        bm25=self.get_bm25_index(),
+                        k=k,
+                        fetch_k=max(k, config.HYBRID_FETCH_K),
+                        rrf_k=config.HYBRID_RRF_K,
+                    )
+                else:
+                    retriever = self.get_vectorstore().as_retriever(search_kwargs={"k": k})
+                self._retrievers[k] = MemoizedRetriever(
+                    retriever=retriever,
+                    memo=self.retrieval_memo,
+                    index_version=lambda: self.index_version,
+                    k=k,
+                )
+            return self._retrievers[k]
+
+    def get_rag_chain(self):
+        with self._lock:
+            if self._rag_chain is None:
+                from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+                self._rag_chain = (
+                    {"context": self.get_retriever() | RunnableLambda(lambda docs: build_context(docs)[0]),
+                     "question": RunnablePassthrough()}
+                    | self.get_answer_chain()
+                )
+            return self._rag_chain
+
+    def warm_up(self):
+        if self.has_index() and not self.backend_error():
+            self.get_bm25_index()
+            self.get_figure_index()
+            self.get_rag_chain()
+
+    def reset_index(self):
+        """Close the vector store and drop everything built on it."""
+        with self._lock:
+            if self._vectorstore is not None:
+                if config.VECTOR_BACKEND == "mmap":
+                    self._vectorstore.close()
+                else:
+                    _close_chroma(self.index_path, self._vectorstore)
+            self._vectorstore = None
+            self._bm25 = None
+            self._figure_index = None
+            self._retrievers = {}
+            self._rag_chain = None
+            self._index_version = None
+
+# (registry, handles) pinned by the innermost `ResourceRegistry.lease()` of this request.
+_leased: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("leased_index", default=None)
+
+class ResourceRegistry:
+    """Owner of one workspace's versioned index.
+
+    Reads whichever version `chroma_path/CURRENT` points at through an IndexHandles
+    set, and switches to a new set on the first call after the pointer moves.
+    `lease()` pins the current set for a whole request: it is returned to the
+    caller, and every accessor of this registry called in the lease's context
+    (including threads started with a copy of it) keeps returning it, even after
+    a newer version is published.
+    """
+
+    def __init__(self, chroma_path: str, models: ModelRegistry):
+        self.chroma_path = chroma_path
+        self.models = models
+        self.versions = IndexVersions(chroma_path, config.INDEX_GC_GRACE_SECONDS)
+        self._lock = threading.RLock()
+        self._handles: Optional[IndexHandles] = None
+
+    def handles(self) -> IndexHandles:
+        """The leased handle set in this context, else the one for the current published version."""
+        leased = _leased.get()
+        if leased is not None and leased[0] is self:
+            return leased[1]
+        with self._lock:
+            current = self.versions.current()
+            if self._handles is None or self._handles.version != current:
+                if self._handles is not None:
+                    logger.info(f"Index version changed from {self._handles.version} to {current}; opening new handles.")
+                    self._retire(self._handles)
+                self._handles = IndexHandles(self.versions.path(current) if current else None, self.models, current)
+            return self._handles
+
+    def _retire(self, handles: IndexHandles):
+        """Close a replaced handle set now, or when its last lease ends."""
+        handles.retired = True
+        if not handles.leases:
+            handles.reset_index()
+
+    @contextmanager
+    def lease(self):
+        """Pin the current index version and its handles for the duration of a request."""
+        with self._lock:
+            handles = self.handles()
+            handles.leases += 1
+        try:
+            with self.versions.lease(handles.version):
+                token = _leased.set((self, handles))
+                try:
+                    yield handles
+                finally:
+                    _leased.reset(token)
+        finally:
+            with self._lock:
+                handles.leases -= 1
+                if handles.retired and not handles.leases:
+                    handles.reset_index()
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.handles().version
+
+    @property
+    def load_times(self):
+        return self.handles().load_times
+
+    def has_index(self) -> bool:
+        return self.handles().has_index()
+
+    def backend_error(self) -> Optional[str]:
+        return self.handles().backend_error()
+
+    @property
+    def index_version(self):
+        return self.handles().index_version
+
+    def get_vectorstore(self):
+        return self.handles().get_vectorstore()
+
+    def get_bm25_index(self):
+        return self.handles().get_bm25_index()
+
+    def get_figure_index(self):
+        return self.handles().get_figure_index()
+
+    def get_retriever(self, k: int = config.RETRIEVER_K):
+        return self.handles().get_retriever(k)
+
+    def get_rag_chain(self):
+        return self.handles().get_rag_chain()
+
+    def cache_stats(self):
+        return {"retrieval_memo": self.handles().retrieval_memo.stats(), "index_versions": self.versions.stats()}
+
+    def warm_up(self):
+        """Load the shared models and this index's handles."""
+        self.models.warm_up()
+        self.handles().warm_up()
+
+    def reset_index(self):
+        """Release the handles; requests holding a lease keep theirs until they finish."""
+        with self._lock:
+            if self._handles is not None:
+                self._retire(self._handles)
+            self._handles = None
+
+    def refresh(self):
+        """Open handles for the current version after ingestion, keeping the loaded models."""
+        with self._lock:
+            self.reset_index()
+            if self.has_index():
+                self.get_rag_chain()
+
+models = ModelRegistry()
@@ -0,0 +1,93 @@
+import hashlib
+from typing import Any, Callable, Dict, List, Sequence
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from lru import LRUCache, RetrievalMemo
+from metrics import span
+
+def chunk_key(doc: Document) -> str:
+    return doc.metadata.get("chunk_id") or getattr(doc, "id", None) or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], rrf_k: int = 60) -> List[str]:
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class HybridRetriever(BaseRetriever):
+    """Dense (Chroma) plus sparse (BM25) retrieval merged with reciprocal-rank fusion.
+
+    BM25 only stores chunk ids; the text of sparse hits the dense search missed is
+    fetched from the vector store by id.
+    """
+
+    vectorstore: Any
+    bm25: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense_docs = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        by_key = {chunk_key(doc): doc for doc in dense_docs}
+        sparse_keys = [doc_id for doc_id, _ in self.bm25.search(query, self.fetch_k)]
+        missing = [doc_id for doc_id in sparse_keys if doc_id not in by_key]
+        if missing:
+            stored = self.vectorstore.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                by_key[doc_id] = Document(page_content=text, metadata=dict(metadata or {}, chunk_id=doc_id))
+            sparse_keys = [doc_id for doc_id in sparse_keys if doc_id in by_key]
+        fused = reciprocal_rank_fusion([[chunk_key(doc) for doc in dense_docs], sparse_keys], self.rrf_k)
+        results, seen_texts = [], set()
+        for key in fused:
+            doc = by_key[key]
+            if doc.page_content in seen_texts:
+                continue
+            seen_texts.add(doc.page_content)
+            results.append(doc)
+            if len(results) == self.k:
+                break
+        return results
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps an embedder with an LRU cache for query embeddings.
+
+    Document embedding and any other attribute access go straight to the wrapped model.
+    """
+
+    def __init__(self, base: Embeddings, max_entries: int):
+        self.base = base
+        self.cache = LRUCache(max_entries)
+
+    def __getattr__(self, name):
+        return getattr(self.base, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.base.embed_query(text)
+            self.cache.put(text, vector)
+        return list(vector)
+
+class MemoizedRetriever(BaseRetriever):
+    """Serves repeated queries from a RetrievalMemo shared by chat and report tools."""
+
+    retriever: Any
+    memo: Any
+    index_version: Callable[[], Any]
+    k: int
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with span("retrieve"):
+            version = self.index_version()
+            docs = self.memo.lookup(version, query, self.k)
+            if docs is None:
+                docs = self.retriever.invoke(query)
+                self.memo.store(version, query, self.k, docs)
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in docs]
@@ -0,0 +1,165 @@
+import time
+import logging
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+import config
+from resources import models
+from workspaces import current_workspace
+from metrics import span
+from concurrency import generation_limiter
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT = """Summarize the key facts, figures and findings in the following document excerpt in at most five sentences. Use only the excerpt.
+
+Excerpt:
+{text}
+"""
+
+REDUCE_PROMPT = """Combine the following partial summaries into one concise, professional summary covering the key aspects of '{topic}'. If the topic is general, focus on prevalence, risk factors, progression, assessment, and key research findings. Use only the information in the partial summaries and do not repeat points.
+
+Partial summaries:
+{summaries}
+"""
+
+# Bump when MAP_PROMPT changes so stale chunk summaries are not reused.
+MAP_PROMPT_VERSION = "1"
+
+class SummaryCache:
+    """SQLite store of per-chunk (map) summaries keyed by model, prompt version and chunk text hash.
+
+    When the stored summaries exceed `max_bytes`, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(summaries)")]
+        if "last_used" not in columns:
+            self._conn.execute("ALTER TABLE summaries ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+        self._conn.commit()
+        self._bytes, self._count = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(CAST(summary AS BLOB))), 0), COUNT(*) FROM summaries"
+        ).fetchone()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(f"{config.LLM_MODEL_NAME}\0{MAP_PROMPT_VERSION}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.hits += 1
+                self._conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+            else:
+                self.misses += 1
+            return row[0] if row else None
+
+    def put(self, key: str, summary: str):
+        size = len(summary.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT LENGTH(CAST(summary AS BLOB)) FROM summaries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, last_used) VALUES (?, ?, ?)", (key, summary, time.time())
+            )
+            self._bytes += size - (old[0] if old else 0)
+            self._count += 0 if old else 1
+            self._conn.commit()
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        excess_rows = int((self._bytes - self.max_bytes) / (self._bytes / self._count)) + 1
+        freed, removed = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(CAST(summary AS BLOB))), 0), COUNT(*) FROM "
+            "(SELECT summary FROM summaries ORDER BY last_used LIMIT ?)", (excess_rows,)
+        ).fetchone()
+        self._conn.execute(
+            "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_used LIMIT ?)", (excess_rows,)
+        )
+        self._conn.commit()
+        self._bytes -= freed
+        self._count -= removed
+        logger.info(f"Summary cache over {self.max_bytes} bytes. Evicted {removed} least recently used summaries.")
+
+class MapReduceSummarizer:
+    """Summarizes each chunk in parallel (map), then merges the summaries in groups (reduce).
+
+    Map results are cached per chunk, so repeated summaries over the same corpus only
+    pay for the reduce calls. Every LLM call holds its own generation slot, so the
+    `workers` fan-out never exceeds LLM_MAX_CONCURRENCY across the server.
+    """
+
+    def __init__(self, llm, cache: SummaryCache, workers: int = config.SUMMARY_WORKERS,
+                 fan_in: int = config.SUMMARY_REDUCE_FAN_IN):
+        self.map_chain = ChatPromptTemplate.from_template(MAP_PROMPT) | llm | StrOutputParser()
+        self.reduce_chain = ChatPromptTemplate.from_template(REDUCE_PROMPT) | llm | StrOutputParser()
+        self.cache = cache
+        self.workers = workers
+        self.fan_in = max(2, fan_in)
+
+    def _generate(self, chain, inputs: List[dict]) -> List[str]:
+        def call(item):
+            with generation_limiter.thread_slot():
+                return chain.invoke(item)
+        return RunnableLambda(call).batch(inputs, config={"max_concurrency": self.workers})
+
+    def map(self, docs: List[Document]) -> List[str]:
+        texts = list(dict.fromkeys(doc.page_content for doc in docs if doc.page_content.strip()))
+        keys = [SummaryCache.key(text) for text in texts]
+        summaries = [self.cache.get(key) for key in keys]
+        missing = [i for i, summary in enumerate(summaries) if summary is None]
+        logger.debug(f"  -> Map: {len(texts)} chunk(s), {len(texts) - len(missing)} cached summaries")
+        if missing:
+            with span("summary_map"):
+                fresh = self._generate(self.map_chain, [{"text": texts[i]} for i in missing])
+            for i, summary in zip(missing, fresh):
+                summaries[i] = summary.strip()
+                self.cache.put(keys[i], summaries[i])
+        return summaries
+
+    def reduce(self, summaries: List[str], topic: str) -> str:
+        while len(summaries) > 1:
+            groups = [summaries[i:i + self.fan_in] for i in range(0, len(summaries), self.fan_in)]
+            logger.debug(f"  -> Reduce: {len(summaries)} summaries into {len(groups)}")
+            with span("summary_reduce"):
+                summaries = [s.strip() for s in self._generate(
+                    self.reduce_chain, [{"topic": topic, "summaries": "\n\n".join(group)} for group in groups],
+                )]
+        return summaries[0] if summaries else ""
+
+    def summarize(self, topic: str, docs: List[Document]) -> str:
+        summaries = self.map(docs)
+        if len(summaries) == 1:
+            with generation_limiter.thread_slot(), span("summary_reduce"):
+                return self.reduce_chain.invoke({"topic": topic, "summaries": summaries[0]}).strip()
+        return self.reduce(summaries, topic)
+
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+def get_summarizer() -> MapReduceSummarizer:
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = MapReduceSummarizer(models.get_llm(), SummaryCache(
+                config.SUMMARY_CACHE_PATH, int(config.SUMMARY_CACHE_MAX_MB * 1024 * 1024)))
+        return _summarizer
+
+def summarize_topic(topic: str, k: int = config.SUMMARY_CHUNKS) -> str:
+    docs = current_workspace().registry.get_retriever(k).invoke(topic)
+    return get_summarizer().summarize(topic, docs)
@@ -0,0 +1,298 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+import config
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILENAME = "vectors.npy"
+SCALES_FILENAME = "vector_scales.npy"
+IVF_FILENAME = "vector_ivf.npz"
+META_FILENAME = "vector_meta.sqlite3"
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Rows scored per block, so int8/float16 matrices are never widened to float32 all at once.
+SEARCH_BLOCK_ROWS = 65536
+IVF_TRAIN_ITERATIONS = 10
+IVF_SAMPLES_PER_LIST = 64
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Cast normalized float32 rows to `dtype`; int8 uses a symmetric per-row scale."""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return vectors.astype(DTYPES[dtype]), None
+
+def dequantize(rows: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows * scales[:, None] if scales is not None else rows
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+def build_ivf(matrix: np.ndarray, scales: Optional[np.ndarray], n_lists: int, seed: int = 0):
+    """Train an inverted-file index: k-means centroids plus rows grouped by nearest centroid.
+
+    Returns (centroids, order, offsets); rows of list `i` are `order[offsets[i]:offsets[i + 1]]`.
+    """
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(len(matrix), min(len(matrix), n_lists * IVF_SAMPLES_PER_LIST), replace=False))
+    sample = _normalize(dequantize(matrix[sample_rows], scales[sample_rows] if scales is not None else None))
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(IVF_TRAIN_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=n_lists)
+        filled = counts > 0
+        centroids[filled] = _normalize(sums[filled] / counts[filled, None])
+    assignment = np.concatenate([
+        np.argmax(dequantize(matrix[start:start + SEARCH_BLOCK_ROWS],
+                             scales[start:start + SEARCH_BLOCK_ROWS] if scales is not None else None) @ centroids.T, axis=1)
+        for start in range(0, len(matrix), SEARCH_BLOCK_ROWS)
+    ])
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+    return centroids.astype(np.float32), order.astype(np.int64), offsets.astype(np.int64)
+
+def _save_npy(path: str, array: np.ndarray):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+class MmapVectorStore(VectorStore):
+    """Vector store kept as one contiguous matrix on disk, opened with mmap.
+
+    Vectors are L2-normalized and stored as float32, float16 or int8 (with per-row
+    scales), so every worker process shares the same page-cache copy instead of
+    holding its own. Search is a blocked NumPy dot product plus top-k; collections
+    of `ann_min_rows` or more also get an inverted-file index, and a query then
+    scores only the rows of its `nprobe` nearest lists, or of as many more as it
+    takes to reach k candidates. Texts and metadata sit in a
+    SQLite side table whose row ids match the matrix rows.
+
+    Writes are buffered and applied by `flush()`, which rewrites the files
+    atomically; ingestion only ever writes to an unpublished index version.
+    """
+
+    def __init__(self, directory: str, embedding_function, dtype: str = config.MMAP_VECTOR_DTYPE,
+                 ann_min_rows: int = config.MMAP_ANN_MIN_ROWS, nprobe: int = config.MMAP_ANN_NPROBE):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{dtype}'. Use one of {', '.join(DTYPES)}.")
+        self.directory = directory
+        self._embeddings = embedding_function
+        self.dtype = dtype
+        self.ann_min_rows = ann_min_rows
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._pending: Dict[str, Tuple[List[float], str, Dict]] = {}
+        self._deleted = set()
+        self._open()
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _open(self):
+        self.matrix = np.load(self._path(VECTORS_FILENAME), mmap_mode="r") if os.path.exists(self._path(VECTORS_FILENAME)) else None
+        self.scales = np.load(self._path(SCALES_FILENAME), mmap_mode="r") if os.path.exists(self._path(SCALES_FILENAME)) else None
+        self.ivf = None
+        if os.path.exists(self._path(IVF_FILENAME)):
+            with np.load(self._path(IVF_FILENAME)) as data:
+                self.ivf = (data["centroids"], data["order"], data["offsets"])
+        self._conn = None
+        if os.path.exists(self._path(META_FILENAME)):
+            self._conn = sqlite3.connect(f"file:{self._path(META_FILENAME)}?mode=ro", uri=True, check_same_thread=False)
+
+    def __len__(self) -> int:
+        return 0 if self.matrix is None else len(self.matrix)
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if rows is not None:
+            return dequantize(self.matrix[rows], self.scales[rows] if self.scales is not None else None) @ query
+        return np.concatenate([
+            dequantize(self.matrix[start:start + SEARCH_BLOCK_ROWS],
+                       self.scales[start:start + SEARCH_BLOCK_ROWS] if self.scales is not None else None) @ query
+            for start in range(0, len(self.matrix), SEARCH_BLOCK_ROWS)
+        ])
+
+    def search_vector(self, embedding: List[float], k: int) -> List[Tuple[int, float]]:
+        """[(row, cosine similarity)] of the `k` nearest rows."""
+        if not len(self):
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        rows = None
+        if self.ivf is not None:
+            centroids, order, offsets = self.ivf
+            # Probe the nearest `nprobe` lists, plus further ones until they hold at least k rows.
+            ranked = np.argsort(-(centroids @ query))
+            sizes = np.diff(offsets)[ranked]
+            n_lists = max(self.nprobe, int(np.searchsorted(np.cumsum(sizes), min(k, len(self))) + 1))
+            if n_lists < len(centroids):
+                rows = np.sort(np.concatenate([order[offsets[i]:offsets[i + 1]] for i in ranked[:n_lists]]))
+        scores = self._scores(query, rows)
+        best = top_k(scores, k)
+        return [(int(rows[i] if rows is not None else i), float(scores[i])) for i in best]
+
+    def _fetch(self, rows: List[int]) -> Dict[int, Tuple[str, str, Dict]]:
+        if not rows or self._conn is None:
+            return {}
+        with self._lock:
+            found = self._conn.execute(
+                f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({','.join('?' * len(rows))})",
+                [row + 1 for row in rows],
+            ).fetchall()
+        return {row - 1: (chunk_id, text, json.loads(metadata)) for row, chunk_id, text, metadata in found}
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        hits = self.search_vector(embedding, k)
+        stored = self._fetch([row for row, _ in hits])
+        return [(Document(page_content=stored[row][1], metadata=stored[row][2]), score) for row, score in hits if row in stored]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embeddings.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    def get(self, ids: Optional[List[str]] = None, include: Iterable[str] = ("documents", "metadatas")) -> Dict[str, List]:
+        """Stored chunks (all of them, or those in `ids`) in row order, in the shape Chroma's `get()` returns."""
+        if self._conn is None:
+            return {"ids": [], "documents": [], "metadatas": []}
+        with self._lock:
+            if ids is None:
+                found = self._conn.execute("SELECT id, text, metadata FROM chunks ORDER BY row").fetchall()
+            else:
+                found = self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(ids))}) ORDER BY row", list(ids)
+                ).fetchall()
+        return {"ids": [r[0] for r in found], "documents": [r[1] for r in found], "metadatas": [json.loads(r[2]) for r in found]}
+
+    def upsert_vectors(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]):
+        with self._lock:
+            for chunk_id, vector, text, metadata in zip(ids, embeddings, documents, metadatas):
+                self._deleted.add(chunk_id)
+                self._pending[chunk_id] = (vector, text, metadata)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [os.urandom(16).hex() for _ in texts]
+        self.upsert_vectors(ids, self._embeddings.embed_documents(texts), texts, metadatas)
+        self.flush()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        with self._lock:
+            for chunk_id in ids or []:
+                self._deleted.add(chunk_id)
+                self._pending.pop(chunk_id, None)
+        return True
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding, metadatas: Optional[List[Dict]] = None, **kwargs: Any) -> "MmapVectorStore":
+        store = cls(kwargs.pop("persist_directory"), embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def close(self):
+        """Close the side table and drop the memory maps; buffered writes are discarded."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self.matrix = self.scales = self.ivf = None
+            self._pending.clear()
+            self._deleted.clear()
+
+    def flush(self):
+        """Apply buffered upserts and deletes by rewriting the matrix, side table and IVF index."""
+        with self._lock:
+            if not self._pending and (not self._deleted or self.matrix is None):
+                self._deleted.clear()
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            old_ids = self.get(include=())["ids"]
+            keep = np.array([chunk_id not in self._deleted for chunk_id in old_ids], dtype=bool)
+            meta_tmp = f"{self._path(META_FILENAME)}.tmp"
+            if os.path.exists(meta_tmp):
+                os.remove(meta_tmp)
+            conn = sqlite3.connect(meta_tmp)
+            conn.execute("CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+            if self._conn is not None:
+                conn.execute("CREATE TEMP TABLE deleted (id TEXT PRIMARY KEY)")
+                conn.executemany("INSERT OR IGNORE INTO deleted (id) VALUES (?)", [(i,) for i in self._deleted])
+                conn.execute("ATTACH DATABASE ? AS old", (self._path(META_FILENAME),))
+                conn.execute("INSERT INTO chunks (id, text, metadata) SELECT id, text, metadata FROM old.chunks "
+                             "WHERE id NOT IN (SELECT id FROM deleted) ORDER BY row")
+                conn.commit()
+                conn.execute("DETACH DATABASE old")
+            conn.executemany("INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                             [(chunk_id, text, json.dumps(metadata)) for chunk_id, (_, text, metadata) in self._pending.items()])
+            conn.commit()
+            conn.close()
+
+            if self._pending:
+                fresh = _normalize(np.asarray([vector for vector, _, _ in self._pending.values()], dtype=np.float32))
+            else:
+                fresh = np.zeros((0, self.matrix.shape[1] if self.matrix is not None else 0), dtype=np.float32)
+            new_rows, new_scales = quantize(fresh, self.dtype)
+            if self.matrix is not None and keep.any():
+                kept_scales = self.scales[keep] if self.scales is not None else None
+                if self.matrix.dtype == DTYPES[self.dtype]:
+                    kept_rows = np.asarray(self.matrix[keep])
+                else:
+                    kept_rows, kept_scales = quantize(dequantize(self.matrix[keep], kept_scales), self.dtype)
+                new_rows = np.concatenate([kept_rows, new_rows]) if len(new_rows) else kept_rows
+                if new_scales is not None:
+                    new_scales = np.concatenate([kept_scales, new_scales])
+
+            if self._conn is not None:
+                self._conn.close()
+            self.matrix = self.scales = None
+            _save_npy(self._path(VECTORS_FILENAME), new_rows)
+            if new_scales is not None:
+                _save_npy(self._path(SCALES_FILENAME), new_scales)
+            elif os.path.exists(self._path(SCALES_FILENAME)):
+                os.remove(self._path(SCALES_FILENAME))
+            if len(new_rows) >= self.ann_min_rows:
+                n_lists = max(1, int(np.sqrt(len(new_rows))))
+                centroids, order, offsets = build_ivf(new_rows, new_scales, n_lists)
+                tmp_path = f"{self._path(IVF_FILENAME)}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.savez(f, centroids=centroids, order=order, offsets=offsets)
+                os.replace(tmp_path, self._path(IVF_FILENAME))
+            elif os.path.exists(self._path(IVF_FILENAME)):
+                os.remove(self._path(IVF_FILENAME))
+            os.replace(meta_tmp, self._path(META_FILENAME))
+            logger.info(f"Vector index written: {len(new_rows)} {self.dtype} row(s), {len(self._pending)} added, "
+                        f"{int((~keep).sum())} removed{', IVF rebuilt' if len(new_rows) >= self.ann_min_rows else ''}.")
+            self._pending.clear()
+            self._deleted.clear()
+            self._open()
@@ -0,0 +1,53 @@
+import logging
+import time
+import threading
+from typing import Any, Dict
+import config
+from resources import models
+from workspaces import workspaces, DEFAULT_WORKSPACE
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ["embeddings", "vectorstore", "bm25", "figure_index", "llm", "graph", "report_generator"]
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"status": "idle", "error": None, "started_at": None, "finished_at": None}
+
+def warm_up() -> Dict[str, Any]:
+    """Load the models, the default workspace's index handles and the report pipeline so the first request doesn't pay for them."""
+    with _lock:
+        _state.update(status="warming", error=None, started_at=time.time(), finished_at=None)
+        logger.info("--- 🔥 Warming up ---")
+        try:
+            workspaces.get(DEFAULT_WORKSPACE).registry.warm_up()
+            with models.timed("graph"):
+                import graph
+                graph.get_agent_app() if config.REPORT_MODE == "agent" else graph.get_planned_app()
+            with models.timed("report_generator"):
+                import report_generator
+            _state["status"] = "ready"
+            logger.info("--- 🔥 Warm-up complete ---")
+        except Exception as e:
+            logger.error(f"--- ❌ Warm-up failed: {e} ---")
+            _state.update(status="failed", error=str(e))
+        finally:
+            _state["finished_at"] = time.time()
+    return readiness()
+
+def warm_up_in_background():
+    threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+
+def readiness() -> Dict[str, Any]:
+    """Which components are loaded and how long each took; ready once chat can answer without cold starts."""
+    registry = workspaces.get(DEFAULT_WORKSPACE).registry
+    load_times = {**models.load_times, **registry.load_times}
+    has_index = registry.has_index()
+    index_error = registry.backend_error()
+    required = ["embeddings", "llm"] + (["vectorstore"] if has_index else [])
+    return {
+        "ready": index_error is None and all(name in load_times for name in required),
+        "has_index": has_index,
+        "index_error": index_error,
+        "warmup": dict(_state),
+        "components": {name: {"loaded": name in load_times, "seconds": load_times.get(name)} for name in COMPONENTS},
+    }
@@ -0,0 +1,122 @@
+import os
+import re
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import config
+from resources import ResourceRegistry, models
+from answer_cache import SemanticAnswerCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKSPACE = "default"
+WORKSPACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+class InvalidWorkspaceError(ValueError):
+    pass
+
+class Workspace:
+    """One named document collection: its data directory, Chroma index, retriever and answer cache."""
+
+    def __init__(self, workspace_id: str, data_path: str, chroma_path: str):
+        self.id = workspace_id
+        self.data_path = data_path
+        self.chroma_path = chroma_path
+        self.registry = ResourceRegistry(chroma_path, models)
+        self.answer_cache = SemanticAnswerCache(config.ANSWER_CACHE_MAX_ENTRIES, config.ANSWER_CACHE_TTL_SECONDS,
+                                                config.ANSWER_CACHE_MAX_DISTANCE, lambda: self.registry.version)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"has_index": self.registry.has_index(), "index_version": self.registry.index_version,
+                "answer_cache": self.answer_cache.stats(), **self.registry.cache_stats()}
+
+class WorkspaceManager:
+    """Named workspaces, each with its own index, served from a bounded LRU.
+
+    Only the `max_active` most recently used workspaces keep their vector store,
+    BM25 index and retriever loaded; older ones are dropped and rebuilt lazily on
+    their next request. The "default" workspace uses DATA_PATH and CHROMA_PATH,
+    others live under `root/<id>/`. Ingestion locks are kept per workspace id so
+    uploads to one workspace never wait for another; they only cover this process,
+    and other Uvicorn workers are kept out by the index's `writer_lock()`.
+    """
+
+    def __init__(self, root: str, max_active: int):
+        self.root = root
+        self.max_active = max(1, max_active)
+        self._active: "OrderedDict[str, Workspace]" = OrderedDict()
+        self._ingest_locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @staticmethod
+    def validate(workspace_id: Optional[str]) -> str:
+        workspace_id = workspace_id or DEFAULT_WORKSPACE
+        if not WORKSPACE_ID_PATTERN.match(workspace_id):
+            raise InvalidWorkspaceError(f"Invalid workspace id '{workspace_id}'. Use letters, digits, '-' and '_' (max 64).")
+        return workspace_id
+
+    def paths(self, workspace_id: str):
+        if workspace_id == DEFAULT_WORKSPACE:
+            return config.DATA_PATH, config.CHROMA_PATH
+        base = os.path.join(self.root, workspace_id)
+        return os.path.join(base, "data"), os.path.join(base, "chroma_db")
+
+    def get(self, workspace_id: Optional[str] = None) -> Workspace:
+        workspace_id = self.validate(workspace_id)
+        with self._lock:
+            workspace = self._active.get(workspace_id)
+            if workspace is None:
+                workspace = Workspace(workspace_id, *self.paths(workspace_id))
+                self._active[workspace_id] = workspace
+                while len(self._active) > self.max_active:
+                    evicted_id, evicted = self._active.popitem(last=False)
+                    evicted.registry.reset_index()
+                    self.evictions += 1
+                    logger.info(f"Workspace '{evicted_id}' idle; released its index handles.")
+            self._active.move_to_end(workspace_id)
+            return workspace
+
+    def refresh(self, workspace: Workspace):
+        """Reload index handles after ingestion, including those of a newer active instance of the same workspace."""
+        workspace.registry.refresh()
+        with self._lock:
+            active = self._active.get(workspace.id)
+        if active is not None and active is not workspace:
+            active.registry.refresh()
+
+    def ingest_lock(self, workspace_id: str) -> threading.Lock:
+        with self._lock:
+            return self._ingest_locks[workspace_id]
+
+    def list(self) -> List[str]:
+        names = {DEFAULT_WORKSPACE}
+        if os.path.isdir(self.root):
+            names.update(name for name in os.listdir(self.root)
+                         if WORKSPACE_ID_PATTERN.match(name) and os.path.isdir(os.path.join(self.root, name)))
+        return sorted(names)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = list(self._active.values())
+        return {"max_active": self.max_active, "evictions": self.evictions,
+                "active": {workspace.id: workspace.stats() for workspace in active}}
+
+workspaces = WorkspaceManager(config.WORKSPACES_DIR, config.MAX_ACTIVE_WORKSPACES)
+
+_current_workspace: contextvars.ContextVar[Optional[Workspace]] = contextvars.ContextVar("documind_workspace", default=None)
+
+@contextmanager
+def use_workspace(workspace: Workspace):
+    """Make `workspace` the one report tools and summaries read from in this context."""
+    token = _current_workspace.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current_workspace.reset(token)
+
+def current_workspace() -> Workspace:
+    return _current_workspace.get() or workspaces.get(DEFAULT_WORKSPACE)
@@ -8,7 +8,6 @@ import {
 import SendIcon from '@mui/icons-material/Send';
 import PersonIcon from '@mui/icons-material/Person';
 import AssistantIcon from '@mui/icons-material/Assistant';
-import axios from 'axios';
 
 const ChatComponent = ({ isReady }) => {
   const [message, setMessage] = useState('');
@@ -40,20 +39,57 @@ const ChatComponent = ({ isReady }) => {
         setMessage('');
         setIsLoading(true);
         try {
-          const response = await axios.post('http://127.0.0.1:8000/chat/', { query: userMessage.content });
-          const aiMessage = { role: 'ai', content: response.data.answer };
-          setChatHistory((prev) => [...prev, aiMessage]);
+          setChatHistory((prev) => [...prev, { role: 'ai', content: '', sources: [] }]);
+          await streamAnswer(userMessage.content);
         } catch (error) {
           console.error('Chat error:', error);
-          const errorText = `Error: ${error.response?.data?.detail || 'Could not get response from assistant.'}`;
-          const errorMessage = { role: 'ai', content: errorText };
-          setChatHistory((prev) => [...prev, errorMessage]);
+          const errorText = `Error: ${error.message || 'Could not get response from assistant.'}`;
+          updateLastMessage((last) => ({ ...last, content: last.content || errorText }));
           showSnackbar(errorText, 'error');
         } finally {
           setIsLoading(false);
         }
   };
 
+  const updateLastMessage = (update) => {
+    setChatHistory((prev) => [...prev.slice(0, -1), update(prev[prev.length - 1])]);
+  };
+
+  // POST to the SSE endpoint and render 'sources' then 'token' events as they arrive
+  const streamAnswer = async (query) => {
+    const response = await fetch('http://127.0.0.1:8000/chat/stream/', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ query }),
+    });
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}));
+      throw new Error(body.detail || `Request failed with status ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const frames = buffer.split('\n\n');
+      buffer = frames.pop();
+      for (const frame of frames) {
+        const event = frame.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] || '{}');
+        if (event === 'sources') {
+          setIsLoading(false);
+          updateLastMessage((last) => ({ ...last, sources: data }));
+        } else if (event === 'token') {
+          updateLastMessage((last) => ({ ...last, content: last.content + data.token }));
+        } else if (event === 'error') {
+          throw new Error(data.detail);
+        }
+      }
+    }
+  };
+
   const handleKeyPress = (event) => {
     if (event.key === 'Enter' && !event.shiftKey) {
       event.preventDefault();
@@ -84,7 +120,7 @@ const ChatComponent = ({ isReady }) => {
             </ListItem>
         )}
         {/* Map through chat history */}
-        {chatHistory.map((chat, index) => (
+        {chatHistory.map((chat, index) => (chat.role === 'ai' && !chat.content && !chat.sources?.length) ? null : (
           <ListItem key={index} sx={{ display: 'flex', justifyContent: chat.role === 'user' ? 'flex-end' : 'flex-start' }}>
             {chat.role === 'ai' && <Avatar sx={{ bgcolor: theme.palette.grey[300], mr: 1 }}><AssistantIcon fontSize="small"/></Avatar>}
             <Box
@@ -97,6 +133,11 @@ const ChatComponent = ({ isReady }) => {
               }}
             >
               <Typography variant="body1">{chat.content}</Typography>
+              {chat.sources?.length > 0 && (
+                <Typography variant="caption" color="text.secondary" sx={{ display: 'block', mt: 1 }}>
+                  Sources: {[...new Set(chat.sources.map((s) => s.metadata?.source?.split(/[\\/]/).pop()))].join(', ')}
+                </Typography>
+              )}
             </Box>
             {chat.role === 'user' && <Avatar sx={{ bgcolor: 'primary.light', ml: 1 }}><PersonIcon fontSize="small"/></Avatar>}
           </ListItem>
@@ -12,6 +12,7 @@ const FileUploadComponent = ({ onUploadSuccess }) => {
   const [selectedFiles, setSelectedFiles] = useState(null);
   const [isUploading, setIsUploading] = useState(false);
   const [uploadProgress, setUploadProgress] = useState(0);
+  const [jobStatus, setJobStatus] = useState(null);
   const [snackbarOpen, setSnackbarOpen] = useState(false);
   const [snackbarMessage, setSnackbarMessage] = useState('');
   const [snackbarSeverity, setSnackbarSeverity] = useState('info');
@@ -29,6 +30,20 @@ const FileUploadComponent = ({ onUploadSuccess }) => {
     setSnackbarOpen(true);
   };
 
+  // Poll the ingestion job until it finishes, reflecting per-file progress in the bar
+  const pollJob = async (jobId) => {
+    setJobStatus(null);
+    while (true) {
+      const { data } = await axios.get(`http://127.0.0.1:8000/jobs/${jobId}`);
+      setJobStatus(data);
+      if (data.files_total > 0) {
+        setUploadProgress(Math.round((data.files_done * 100) / data.files_total));
+      }
+      if (data.status === 'completed' || data.status === 'failed') return data;
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleUpload = async () => {
     if (!selectedFiles || selectedFiles.length === 0) {
         showSnackbar('Please select files to upload.', 'warning');
@@ -49,17 +64,24 @@ const FileUploadComponent = ({ onUploadSuccess }) => {
             setUploadProgress(percentCompleted);
           },
         });
-        showSnackbar(response.data.message, 'success');
+        showSnackbar(response.data.message, 'info');
         setSelectedFiles(null);
         if (fileInputRef.current) {
           fileInputRef.current.value = ''; // Clear file input
         }
-        onUploadSuccess(); // Notify parent
+        const job = await pollJob(response.data.job_id);
+        if (job.status === 'failed') {
+          showSnackbar(`Processing failed: ${job.error}`, 'error');
+        } else {
+          showSnackbar(`Processed ${job.files_done} file(s), ${job.chunks_embedded} new chunk(s) embedded.`, 'success');
+          onUploadSuccess(); // Notify parent
+        }
       } catch (error) {
         console.error('Upload error:', error);
         showSnackbar(error.response?.data?.detail || 'An unexpected error occurred during upload.', 'error');
       } finally {
         setIsUploading(false);
+        setJobStatus(null);
         setTimeout(() => setUploadProgress(0), 1500); // Reset progress bar after a delay
       }
   };
@@ -83,7 +105,16 @@ const FileUploadComponent = ({ onUploadSuccess }) => {
             />
           </Button>
           {isUploading ? (
-             <LinearProgress variant="determinate" value={uploadProgress} sx={{ height: 8, borderRadius: 4 }}/>
+             <Box>
+               <LinearProgress variant="determinate" value={uploadProgress} sx={{ height: 8, borderRadius: 4 }}/>
+               {jobStatus && (
+                 <Typography variant="caption" color="text.secondary" sx={{ display: 'block', textAlign: 'center', mt: 1 }}>
+                   {jobStatus.files_done}/{jobStatus.files_total} file(s) processed
+                   {' · '}{jobStatus.chunks_per_second} chunks/s
+                   {' · '}{Object.entries(jobStatus.files).map(([name, f]) => `${name}: ${f.stage}`).join(', ')}
+                 </Typography>
+               )}
+             </Box>
           ) : selectedFiles && selectedFiles.length > 0 && (
              <Typography variant="caption" color="text.secondary" sx={{ textAlign: 'center', mt: 1, wordBreak: 'break-word' }}>
                 Selected: {Array.from(selectedFiles).map(f => f.name).join(', ')}
@@ -11,6 +11,7 @@ import axios from 'axios';
 const ReportComponent = ({ isReady }) => {
     const [reportRequest, setReportRequest] = useState('Generate a report with Introduction and Clinical Findings');
     const [isGenerating, setIsGenerating] = useState(false);
+    const [sections, setSections] = useState({});
     const [snackbarOpen, setSnackbarOpen] = useState(false);
     const [snackbarMessage, setSnackbarMessage] = useState('');
     const [snackbarSeverity, setSnackbarSeverity] = useState('info');
@@ -22,6 +23,38 @@ const ReportComponent = ({ isReady }) => {
         setSnackbarOpen(true);
     };
 
+    // Listen to per-section SSE events until the job completes or fails
+    const followReportEvents = (eventsUrl) => new Promise((resolve, reject) => {
+        const source = new EventSource(`http://127.0.0.1:8000${eventsUrl}`);
+        const updateSection = (event, status) => {
+            const data = JSON.parse(event.data);
+            const key = `${data.section} — ${data.argument || data.tool}`;
+            setSections((prev) => ({ ...prev, [key]: { status, duration: data.duration } }));
+        };
+        source.addEventListener('planned', (event) => {
+            const { sections: planned } = JSON.parse(event.data);
+            setSections(Object.fromEntries(planned.map((p) => [`${p.title} — ${p.argument}`, { status: 'planned' }])));
+        });
+        source.addEventListener('retrieving', (event) => updateSection(event, 'retrieving'));
+        source.addEventListener('generating', (event) => updateSection(event, 'generating'));
+        source.addEventListener('done', (event) => updateSection(event, 'done'));
+        source.addEventListener('rendering', () => setSections((prev) => ({ ...prev, 'PDF': { status: 'rendering' } })));
+        source.addEventListener('completed', (event) => {
+            const data = JSON.parse(event.data);
+            setSections((prev) => ({ ...prev, 'PDF': { status: 'done', duration: data.duration } }));
+            source.close();
+            resolve();
+        });
+        source.addEventListener('failed', (event) => {
+            source.close();
+            reject(new Error(JSON.parse(event.data).error || 'Report generation failed.'));
+        });
+        source.onerror = () => {
+            source.close();
+            reject(new Error('Lost connection to the report progress stream.'));
+        };
+    });
+
     const handleGenerateReport = async () => {
         if (!reportRequest.trim() || !isReady) {
             if (!isReady) showSnackbar('Please upload documents before generating a report.', 'warning');
@@ -29,15 +62,15 @@ const ReportComponent = ({ isReady }) => {
         }
 
         setIsGenerating(true);
-        showSnackbar('Generating report... This may take a moment.', 'info');
+        setSections({});
+        showSnackbar('Report queued. Progress is shown below.', 'info');
 
         try {
             // --- Make sure backend URL is correct ---
-            const response = await axios.post('http://127.0.0.1:8000/generate_report/',
-                { request: reportRequest },
-                { responseType: 'blob' } // Expect binary file data
-            );
+            const { data: job } = await axios.post('http://127.0.0.1:8000/generate_report/', { request: reportRequest });
+            await followReportEvents(job.events_url);
 
+            const response = await axios.get(`http://127.0.0.1:8000${job.download_url}`, { responseType: 'blob' });
             const blob = new Blob([response.data], { type: 'application/pdf' });
             const link = document.createElement('a');
             link.href = window.URL.createObjectURL(blob);
@@ -74,6 +107,8 @@ const ReportComponent = ({ isReady }) => {
                 }
             } else if (error.response?.data?.detail) { // Check for standard JSON error
                errorMsg = error.response.data.detail;
+            } else if (error.message) {
+               errorMsg = error.message;
             }
             showSnackbar(errorMsg, 'error');
         } finally {
@@ -101,6 +136,15 @@ const ReportComponent = ({ isReady }) => {
                 >
                     {isGenerating ? 'Generating...' : 'Generate PDF Report'}
                 </Button>
+                {Object.keys(sections).length > 0 && (
+                    <Box sx={{ maxHeight: 200, overflowY: 'auto', bgcolor: theme.palette.grey[50], borderRadius: 1, p: 1 }}>
+                        {Object.entries(sections).map(([name, info]) => (
+                            <Typography key={name} variant="caption" component="div" color={info.status === 'done' ? 'success.main' : 'text.secondary'}>
+                                {name}: {info.status}{info.duration !== undefined ? ` (${info.duration}s)` : ''}
+                            </Typography>
+                        ))}
+                    </Box>
+                )}
             </Stack>
             <Snackbar open={snackbarOpen} autoHideDuration={6000} onClose={() => setSnackbarOpen(false)} anchorOrigin={{ vertical: 'bottom', horizontal: 'center' }}>
                 <Alert onClose={() => setSnackbarOpen(false)} severity={snackbarSeverity} variant="filled" sx={{ width: '100%' }}>